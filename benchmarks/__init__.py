@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks for `nyucal`.
+
+Each ``bench_*`` module can be run on its own, e.g.::
+
+    python -m benchmarks.bench_index
+"""
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark parse throughput of each installed parser backend.
+
+For each backend, times parsing a synthetic page into a document, and
+then parsing every calendar in it, and reports rows per second.
+
+    python -m benchmarks.bench_backends
+"""
+
+from __future__ import print_function
+import timeit
+
+from nyucal import backends, nyucal
+
+from benchmarks.synthetic import make_page
+
+
+def parse_all(page, backend):
+    store = nyucal.CalendarStore(page, backend=backend)
+    for calendar in store.calendars.values():
+        pass
+
+
+def main(n_calendars=50, n_rows=400, repeat=3):
+    page = make_page(n_calendars, n_rows)
+    n = n_calendars * n_rows
+    print('{} calendars x {} rows, {:.1f} MB'.format(
+        n_calendars, n_rows, len(page) / 1e6))
+    for name in sorted(backends.backends):
+        if name not in backends.available_backends():
+            print('{:>12} not installed'.format(name))
+            continue
+        backend = backends.get_backend(name)
+        document = min(timeit.repeat(lambda: backend.parse_string(page),
+                                     number=1, repeat=repeat))
+        total = min(timeit.repeat(lambda: parse_all(page, name),
+                                  number=1, repeat=repeat))
+        print('{:>12} document {:>7.1f} ms  total {:>7.1f} ms '
+              '{:>9.0f} rows/s'.format(name, document * 1e3, total * 1e3,
+                                       n / total))
+
+
+if __name__ == '__main__':
+    main()
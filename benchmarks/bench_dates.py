@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""Microbenchmark of parsing the registrar's dates.
+
+Times :code:`datetime.strptime` against :code:`nyucal.parse_date`, cold
+(cache cleared before each pass) and warm, over every date on the
+golden registrar page in `tests/golden`.
+
+    python -m benchmarks.bench_dates
+"""
+
+from __future__ import print_function
+from datetime import datetime
+import os.path
+import timeit
+
+from nyucal import nyucal
+
+GOLDEN_HTML = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'tests', 'golden',
+    'New York University - University Registrar - Calendars - Academic Calendar.html')  # noqa
+
+
+def golden_dates():
+    """Every formatted date in the golden page's date cells"""
+    store = nyucal.CalendarStore(GOLDEN_HTML)
+    dates = []
+    for table in store._tables.values():
+        for cell in table.findall('tbody/tr/td[1]'):
+            dates.append(cell.text.rstrip(' -\xa0'))
+            br = cell.find('br')
+            if br is not None:
+                dates.append(br.tail)
+    return dates
+
+
+def with_strptime(dates):
+    for text in dates:
+        datetime.strptime(text, '%A, %B %d, %Y').date()
+
+
+def with_parse_date_cold(dates):
+    nyucal.parse_date.cache_clear()
+    for text in dates:
+        nyucal.parse_date(text)
+
+
+def with_parse_date_warm(dates):
+    for text in dates:
+        nyucal.parse_date(text)
+
+
+def main(number=100, repeat=5):
+    dates = golden_dates()
+    print('{} dates ({} distinct), {} passes'.format(
+        len(dates), len(set(dates)), number))
+    baseline = None
+    for func in [with_strptime, with_parse_date_cold, with_parse_date_warm]:
+        best = min(timeit.repeat(lambda: func(dates), number=number,
+                                 repeat=repeat)) / number
+        baseline = baseline or best
+        print('{:>22} {:>10.1f} us/pass {:>6.1f}x'.format(
+            func.__name__, best * 1e6, baseline / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark diffing two snapshots of a large page.
+
+Times :code:`diff_stores` on stores that are already parsed, when the
+sources are byte-for-byte the same, when they differ but no calendar
+does (say, a changed page footer), and when one event in one calendar
+changed.
+
+    python -m benchmarks.bench_diff
+"""
+
+from __future__ import print_function
+import hashlib
+import timeit
+
+from nyucal import nyucal
+from nyucal.diff import diff_stores
+
+from benchmarks.synthetic import make_page
+
+
+def parsed_store(text):
+    store = nyucal.CalendarStore(text)
+    store.digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    list(store.calendars.values())
+    return store
+
+
+def main(n_calendars=50, n_rows=400, repeat=5):
+    page = make_page(n_calendars, n_rows)
+    old = parsed_store(page)
+    cases = [
+        ('same source', parsed_store(page)),
+        ('same calendars', parsed_store(page.replace(
+            '</body>', '<p>Updated</p></body>'))),
+        ('one event renamed', parsed_store(page.replace(
+            'Fall 1000 event 4<', 'Fall 1000 event 4 (revised)<'))),
+    ]
+    print('{} calendars of {} events'.format(n_calendars, n_rows))
+    print('{:>20} {:>10} {:>10}'.format('case', 'changed', 'diff (ms)'))
+    for (label, new) in cases:
+        changed = len(diff_stores(old, new))
+        best = min(timeit.repeat(lambda: diff_stores(old, new), number=1,
+                                 repeat=repeat))
+        print('{:>20} {:>10} {:>10.2f}'.format(label, changed, best * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark exporting every calendar in a store.
+
+Compares looking each calendar's table up with a fresh XPath scan of
+the document (how :code:`CalendarStore.calendar` used to work) with the
+store's one-pass name index.
+
+    python -m benchmarks.bench_index
+"""
+
+from __future__ import print_function
+import io
+import timeit
+
+from nyucal import nyucal
+
+from benchmarks.synthetic import make_page
+
+
+def scan_tables(store):
+    """Look up every calendar's table by rescanning the document"""
+    tree = store._tree
+    for name in [elt.text.strip()
+                 for elt in tree.xpath('//div[@class="calTitle"]')]:
+        [elt.xpath('ancestor::table')[0]
+         for elt in tree.xpath('//div[@class="calTitle"]')
+         if elt.text.strip() == name].pop()
+
+
+def index_tables(store):
+    """Look up every calendar's table through a freshly built index"""
+    store._table_index = None
+    tables = store._tables
+    for name in store.calendar_names:
+        tables[name]
+
+
+def export_all(store):
+    """Write every calendar to CSV"""
+    for name in store.calendar_names:
+        nyucal.GcalCsvWriter(io.StringIO()).write(store.calendar(name))
+
+
+def main(sizes=((9, 40), (100, 10), (500, 4)), repeat=5):
+    print('{:>10} {:>6} {:>12} {:>12} {:>8} {:>12}'.format(
+        'calendars', 'rows', 'scan (ms)', 'index (ms)', 'speedup',
+        'export (ms)'))
+    for n_calendars, n_rows in sizes:
+        store = nyucal.CalendarStore(make_page(n_calendars, n_rows))
+        scan = min(timeit.repeat(lambda: scan_tables(store),
+                                 number=1, repeat=repeat))
+        index = min(timeit.repeat(lambda: index_tables(store),
+                                  number=1, repeat=repeat))
+        export = min(timeit.repeat(lambda: export_all(store),
+                                   number=1, repeat=repeat))
+        print('{:>10} {:>6} {:>12.2f} {:>12.2f} {:>7.1f}x {:>12.2f}'.format(
+            n_calendars, n_rows, scan * 1000, index * 1000, scan / index,
+            export * 1000))
+
+
+if __name__ == '__main__':
+    main()
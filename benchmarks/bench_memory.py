@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark memory held by parsed events.
+
+Parses a synthetic calendar of 10,000 rows and reports the memory
+(traced by :code:`tracemalloc`) held by the resulting
+:code:`Calendar`, per 10,000 events.
+
+    python -m benchmarks.bench_memory
+"""
+
+from __future__ import print_function
+import gc
+import tracemalloc
+
+from nyucal import nyucal
+
+from benchmarks.synthetic import calendar_names, make_page
+
+
+def main(n_rows=10000):
+    store = nyucal.CalendarStore(make_page(1, n_rows))
+    name = calendar_names(1)[0]
+    store.calendar(name)  # warm up caches that would otherwise count
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    calendar = store.calendar(name)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    n = len(calendar.events)
+    print('{} events: {:.0f} kB per 10k events, {:.0f} B per event'.format(
+        n, held * 10000 / n / 1e3, held / n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark merging overlapping archived pages.
+
+Each synthetic page shares half its calendars with the page before it,
+like the registrar's yearly pages.  The pages are parsed first; only
+the merge is timed, through :code:`merge_calendars`' hash index and
+through a pairwise comparison of every event with those kept so far
+(on the smaller sizes only).
+
+    python -m benchmarks.bench_merge
+"""
+
+from __future__ import print_function
+import timeit
+
+from nyucal import nyucal
+
+from benchmarks.synthetic import PAGE_HEAD, PAGE_TAIL, calendar_names, \
+    make_table
+
+
+def make_stores(n_pages, calendars_per_page=8, n_rows=250):
+    """Parsed stores for `n_pages` overlapping pages"""
+    names = calendar_names(calendars_per_page // 2 * (n_pages + 1))
+    stores = []
+    for page in range(n_pages):
+        first = page * calendars_per_page // 2
+        store = nyucal.CalendarStore(
+            PAGE_HEAD
+            + ''.join(make_table(name, n_rows) for name in
+                      names[first:first + calendars_per_page])
+            + PAGE_TAIL)
+        store.source = 'page-{}.html'.format(page)
+        list(store.calendars.values())
+        stores.append(store)
+    return stores
+
+
+def merge_hashed(stores):
+    store = nyucal.CalendarStore.merge(stores)
+    return sum(len(cal.events) for cal in store.calendars.values())
+
+
+def merge_pairwise(stores):
+    """Merge by comparing each event with every event kept so far"""
+    kept = 0
+    merged = nyucal.CalendarStore.merge(stores)
+    for name in merged.calendar_names:
+        events = []
+        for store in merged._tables[name]:
+            for event in store.calendars[name].events:
+                for other in events:
+                    if (other.name, other.start, other.end) == \
+                            (event.name, event.start, event.end):
+                        break
+                else:
+                    events.append(event)
+        kept += len(events)
+    return kept
+
+
+def main(sizes=(5, 10, 20, 40), pairwise_up_to=10, repeat=3):
+    print('{:>6} {:>8} {:>8} {:>12} {:>14} {:>14}'.format(
+        'pages', 'events', 'unique', 'hash (ms)', 'hash (us/ev)',
+        'pairwise (ms)'))
+    for n_pages in sizes:
+        stores = make_stores(n_pages)
+        n_events = sum(len(cal.events) for store in stores
+                       for cal in store.calendars.values())
+        unique = merge_hashed(stores)
+        hashed = min(timeit.repeat(lambda: merge_hashed(stores), number=1,
+                                   repeat=repeat))
+        if n_pages <= pairwise_up_to:
+            assert merge_pairwise(stores) == unique
+            pairwise = '{:14.1f}'.format(1e3 * min(timeit.repeat(
+                lambda: merge_pairwise(stores), number=1, repeat=1)))
+        else:
+            pairwise = '{:>14}'.format('-')
+        print('{:>6} {:>8} {:>8} {:>12.1f} {:>14.2f} {}'.format(
+            n_pages, n_events, unique, hashed * 1e3,
+            hashed * 1e6 / n_events, pairwise))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark the cost of metrics.
+
+Times parsing every calendar on a synthetic page and writing them all to
+ICS, with metrics disabled and enabled, and the cost of single metric
+updates either way.
+
+    python -m benchmarks.bench_metrics
+"""
+
+from __future__ import print_function
+import io
+import timeit
+
+from nyucal import metrics, nyucal
+
+from benchmarks.synthetic import make_page
+
+
+def parse_and_write(page):
+    store = nyucal.CalendarStore(page)
+    for calendar in store.calendars.values():
+        nyucal.IcsWriter(io.StringIO()).write(calendar)
+
+
+def main(n_calendars=20, n_rows=400, repeat=5):
+    page = make_page(n_calendars, n_rows)
+    counter = metrics.counter('bench_updates_total', 'Benchmark updates')
+    histogram = metrics.histogram('bench_seconds', 'Benchmark timings')
+
+    def timed_block():
+        with histogram.time():
+            pass
+
+    cases = [
+        ('parse + write {} rows (ms)'.format(n_calendars * n_rows),
+         lambda: parse_and_write(page), 1, 1e3),
+        ('counter.inc() (ns)', counter.inc, 100000, 1e9),
+        ('histogram.time() block (ns)', timed_block, 100000, 1e9),
+    ]
+    print('{:>30} {:>12} {:>12}'.format('case', 'disabled', 'enabled'))
+    for (label, func, number, scale) in cases:
+        times = []
+        for enabled in (False, True):
+            (metrics.enable if enabled else metrics.disable)()
+            times.append(min(timeit.repeat(func, number=number,
+                                           repeat=repeat)) / number * scale)
+        metrics.disable()
+        print('{:>30} {:>12.1f} {:>12.1f}'.format(label, *times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark cold and warm starts through the parsed-calendar cache.
+
+Times building a store from a file and reading every calendar: with no
+cache, with an empty cache (cold: parse, then save), and with a filled
+cache (warm: no HTML parsing at all).
+
+    python -m benchmarks.bench_parsed_cache
+"""
+
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import timeit
+
+from nyucal import nyucal
+from nyucal.cache import ParsedCache
+
+from benchmarks.bench_dates import GOLDEN_HTML
+from benchmarks.synthetic import make_page
+
+
+def read_all(path, parsed_cache=None):
+    store = nyucal.CalendarStore(path, parsed_cache=parsed_cache)
+    for calendar in store.calendars.values():
+        calendar.events
+
+
+def main(repeat=5):
+    directory = tempfile.mkdtemp()
+    try:
+        synthetic = os.path.join(directory, 'synthetic.html')
+        with open(synthetic, 'w') as page_file:
+            page_file.write(make_page(50, 400))
+        print('{:>16} {:>12} {:>12} {:>12} {:>8}'.format(
+            'page', 'none (ms)', 'cold (ms)', 'warm (ms)', 'speedup'))
+        for (label, path) in [('golden', GOLDEN_HTML),
+                              ('50 x 400 rows', synthetic)]:
+            cache_path = os.path.join(directory, 'parsed.sqlite3')
+
+            def cold():
+                if os.path.exists(cache_path):
+                    os.unlink(cache_path)
+                read_all(path, ParsedCache(cache_path))
+
+            none = min(timeit.repeat(lambda: read_all(path), number=1,
+                                     repeat=repeat))
+            cold = min(timeit.repeat(cold, number=1, repeat=repeat))
+            cache = ParsedCache(cache_path)
+            warm = min(timeit.repeat(lambda: read_all(path, cache),
+                                     number=1, repeat=repeat))
+            print('{:>16} {:>12.1f} {:>12.1f} {:>12.1f} {:>7.1f}x'.format(
+                label, none * 1e3, cold * 1e3, warm * 1e3, none / warm))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark date-range and text queries on a large calendar.
+
+Compares :code:`Calendar.between` and :code:`Calendar.search` with a
+scan of every event, on a synthetic calendar of 100,000 events spread
+over about 270 years, a few of them days long.
+
+    python -m benchmarks.bench_query
+"""
+
+from __future__ import print_function
+from datetime import date, timedelta
+import timeit
+
+from nyucal import nyucal
+from nyucal.index import EventIndex, tokenize
+
+NAMES = ['Reading Day', 'Legislative Day', 'Last Day of Classes',
+         'Registration Opens', 'Thanksgiving Recess', 'Final Exams',
+         'Commencement', 'Spring Recess', 'Labor Day', 'Grades Due']
+
+
+def make_calendar(n_events=100000):
+    """A calendar of `n_events` events, one a day, numbered"""
+    cal = nyucal.Calendar()
+    cal.name = 'Synthetic'
+    first_day = date(1900, 1, 1)
+    for i in range(n_events):
+        start = first_day + timedelta(days=i)
+        end = start + timedelta(days=i % 5) if i % 7 == 0 else None
+        cal.add_event(nyucal.Event(
+            name='{} {}'.format(NAMES[i % len(NAMES)], i),
+            description='No classes scheduled', start=start, end=end))
+    return cal
+
+
+def scan_between(cal, start, end):
+    return [event for event in cal.events
+            if event.start <= end and (event.end or event.start) >= start]
+
+
+def scan_search(cal, text):
+    words = set(tokenize(text))
+    return [event for event in cal.events
+            if words <= set(tokenize(event.name)
+                            + tokenize(event.description))]
+
+
+def best(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main(n_events=100000):
+    cal = make_calendar(n_events)
+    cal.events
+    build = best(lambda: EventIndex(cal.events), 1, 3)
+    print('{} events; building the index takes {:.0f} ms'.format(
+        n_events, build * 1e3))
+    print('{:>36} {:>8} {:>12} {:>12} {:>10}'.format(
+        'query', 'results', 'scan (ms)', 'index (us)', 'speedup'))
+    week = (date(2000, 1, 3), date(2000, 1, 9))
+    queries = [
+        ('between a week', cal.between, scan_between, week),
+        ('between ten years', cal.between, scan_between,
+         (date(2000, 1, 1), date(2009, 12, 31))),
+        ("search 'commencement 99996'", cal.search, scan_search,
+         ('commencement 99996',)),
+        ("search 'reading day'", cal.search, scan_search,
+         ('reading day',)),
+    ]
+    for (label, indexed, scanned, args) in queries:
+        results = indexed(*args)
+        assert results == scanned(cal, *args)
+        scan = best(lambda: scanned(cal, *args), 1, 3)
+        index = best(lambda: indexed(*args), 20)
+        print('{:>36} {:>8} {:>12.1f} {:>12.1f} {:>9.0f}x'.format(
+            label, len(results), scan * 1e3, index * 1e6, scan / index))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark row parsing throughput on a large synthetic page.
+
+Reports rows per second for parsing every calendar of a page, with
+debug logging disabled (the production setting), enabled (with a
+handler that throws the records away), and enabled but with the store
+in quiet mode.
+
+    python -m benchmarks.bench_rows
+"""
+
+from __future__ import print_function
+import logging
+import timeit
+
+from nyucal import nyucal
+
+from benchmarks.synthetic import make_page
+
+
+def parse_all(store):
+    for name in store.calendar_names:
+        store.calendar(name)
+
+
+def main(n_calendars=50, n_rows=400, repeat=3):
+    store = nyucal.CalendarStore(make_page(n_calendars, n_rows))
+    n = n_calendars * n_rows
+    root = logging.getLogger()
+    handler = logging.NullHandler()
+    root.addHandler(handler)
+    try:
+        for (level, quiet) in [(logging.WARNING, False),
+                               (logging.DEBUG, False),
+                               (logging.DEBUG, True)]:
+            root.setLevel(level)
+            store.quiet = quiet
+            best = min(timeit.repeat(lambda: parse_all(store), number=1,
+                                     repeat=repeat))
+            print('{:>8} {:>6} {:>10} rows {:>10.0f} rows/s'.format(
+                logging.getLevelName(level), 'quiet' if quiet else '', n,
+                n / best))
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(logging.WARNING)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark peak memory of parsing a whole page versus streaming it.
+
+Each run happens in a fresh interpreter, reading the page from a
+temporary file, and reports the process's peak resident set size
+(libxml2's allocations are invisible to :code:`tracemalloc`).
+
+    python -m benchmarks.bench_stream
+"""
+
+from __future__ import print_function
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import make_page
+
+PROGRAMS = {
+    'baseline': """
+from nyucal import nyucal
+""",
+    'whole': """
+from nyucal import nyucal
+store = nyucal.CalendarStore(path)
+for calendar in store.calendars.values():
+    pass
+""",
+    'stream': """
+from nyucal import nyucal
+for calendar in nyucal.CalendarStore.stream(path):
+    pass
+""",
+}
+
+REPORT = """
+import resource
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_rss(mode, path):
+    """Peak RSS in kB of a fresh interpreter running `mode` on `path`"""
+    program = 'path = {!r}\n'.format(path) + PROGRAMS[mode] + REPORT
+    output = subprocess.check_output([sys.executable, '-c', program])
+    return int(output.split()[-1])
+
+
+def main(sizes=((10, 100), (100, 100), (400, 100))):
+    print('{:>10} {:>6} {:>10} {:>12} {:>12}'.format(
+        'calendars', 'rows', 'page (MB)', 'whole (MB)', 'stream (MB)'))
+    for n_calendars, n_rows in sizes:
+        fd, path = tempfile.mkstemp(suffix='.html')
+        try:
+            with os.fdopen(fd, 'w') as page_file:
+                page_file.write(make_page(n_calendars, n_rows))
+            size = os.path.getsize(path)
+            baseline = peak_rss('baseline', path)
+            whole = peak_rss('whole', path) - baseline
+            stream = peak_rss('stream', path) - baseline
+        finally:
+            os.unlink(path)
+        print('{:>10} {:>6} {:>10.1f} {:>12.1f} {:>12.1f}'.format(
+            n_calendars, n_rows, size / 1e6, whole / 1e3, stream / 1e3))
+
+
+if __name__ == '__main__':
+    main()
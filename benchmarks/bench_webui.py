@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark serving a calendar from the web UI.
+
+Requests `/calendar/Fall 2017.ics` through Flask's test client, with
+the store already loaded: rendering the calendar for every request
+(as the web UI used to), serving the cached rendering, and answering a
+client that already has it with `304 Not Modified`.
+
+    python -m benchmarks.bench_webui
+"""
+
+from __future__ import print_function
+import timeit
+
+import webui
+from benchmarks.bench_dates import GOLDEN_HTML
+
+URL = '/calendar/Fall 2017.ics'
+
+
+def main(number=200, repeat=5):
+    webui.app.config['NYUCAL_SOURCE'] = GOLDEN_HTML
+    client = webui.app.test_client()
+
+    def render_every_time():
+        webui.get_artifact_cache().clear()
+        return client.get(URL)
+
+    response = client.get(URL)
+    etag = response.headers['ETag']
+    cases = [
+        ('render every time', render_every_time),
+        ('cached', lambda: client.get(URL)),
+        ('cached, gzip', lambda: client.get(
+            URL, headers={'Accept-Encoding': 'gzip'})),
+        ('If-None-Match (304)', lambda: client.get(
+            URL, headers={'If-None-Match': etag})),
+    ]
+    print('{:>22} {:>14}'.format('case', 'per call (us)'))
+    for (label, func) in cases:
+        best = min(timeit.repeat(func, number=number, repeat=repeat))
+        print('{:>22} {:>14.0f}'.format(label, best / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
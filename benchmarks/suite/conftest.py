@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""Fixtures for the pytest-benchmark suite.
+
+Each benchmark runs on the golden registrar page and on a synthetic
+page of 50 calendars of 200 rows.  Set `NYUCAL_BENCH_LARGE=1` to add a
+synthetic page of 2000 calendars of 50 rows (about 14 MB).
+
+    make bench-suite      # run it
+    make bench-baseline   # run it and save the results as the baseline
+    make bench-compare    # run it, failing on regressions from the baseline
+    make bench-check      # fail if an optimization has lost its speedup
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from nyucal import nyucal  # noqa: E402
+
+from benchmarks.bench_dates import GOLDEN_HTML  # noqa: E402
+from benchmarks.synthetic import write_page  # noqa: E402
+# the suite runs each benchmark with every parser backend, like the tests
+from tests.conftest import backend  # noqa: E402,F401
+
+PAGES = {
+    'golden': None,
+    'medium': (50, 200),
+    'large': (2000, 50),
+}
+"""Pages benchmarked, by name: `None` for the golden page, otherwise
+the number of calendars and rows of a synthetic page"""
+
+
+@pytest.fixture(scope='session', params=sorted(PAGES))
+def page_path(request, tmp_path_factory):
+    """The path of each page benchmarked"""
+    size = PAGES[request.param]
+    if size is None:
+        return GOLDEN_HTML
+    if request.param == 'large' and not os.environ.get('NYUCAL_BENCH_LARGE'):
+        pytest.skip('set NYUCAL_BENCH_LARGE=1 to benchmark the large page')
+    path = tmp_path_factory.mktemp('pages').joinpath(request.param + '.html')
+    return write_page(str(path), *size)
+
+
+@pytest.fixture(scope='session')
+def store(page_path):
+    """A store of each page, already indexed"""
+    store = nyucal.CalendarStore(page_path)
+    store.calendar_names
+    return store
+
+
+@pytest.fixture(scope='session')
+def calendar(store):
+    """The last calendar of each page, already parsed"""
+    return store.calendars[store.calendar_names[-1]]
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""Checks that each optimized path is still faster than the naive one.
+
+Absolute timings are only comparable on one machine, but how much
+faster a cached, memoized or indexed path is than the plain one it
+replaced hardly depends on the machine, since both are timed in the
+same run.  Each check times the two paths, alternately, and fails if
+the speedup has fallen below its `minimum` in `speedups.json`.  The
+minima are about a quarter of the speedups `recorded` there, so noise
+doesn't fail them, but losing an optimization does.
+
+    make bench-check
+"""
+
+from datetime import date, datetime, timedelta
+import json
+import os
+import timeit
+
+import pytest
+
+from nyucal import nyucal
+from nyucal.cache import ArtifactCache, ParsedCache
+
+from benchmarks.bench_dates import GOLDEN_HTML
+from benchmarks.bench_query import make_calendar, scan_between, scan_search
+from benchmarks.synthetic import write_page
+
+SPEEDUPS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'speedups.json')
+
+with open(SPEEDUPS_PATH) as speedups_file:
+    SPEEDUPS = json.load(speedups_file)
+"""Speedup of each optimized path over its naive counterpart, as
+recorded and the least allowed"""
+
+
+def speedup(fast, slow, number=1, repeat=5):
+    """How many times faster `fast` is than `slow`, by their best times.
+
+    The two are timed by turns, so a slow patch on a busy machine slows
+    both down."""
+    fast_times = []
+    slow_times = []
+    for _ in range(repeat):
+        fast_times.append(timeit.timeit(fast, number=number))
+        slow_times.append(timeit.timeit(slow, number=number))
+    return min(slow_times) / min(fast_times)
+
+
+def check_speedup(name, fast, slow, **kwargs):
+    measured = speedup(fast, slow, **kwargs)
+    minimum = SPEEDUPS[name]['minimum']
+    print('{}: {:.1f}x (recorded {}x, at least {}x)'.format(
+        name, measured, SPEEDUPS[name]['recorded'], minimum))
+    assert measured >= minimum, \
+        '{} is only {:.1f}x faster than the naive path'.format(name, measured)
+
+
+@pytest.fixture(scope='module')
+def medium_page(tmp_path_factory):
+    """A synthetic page of 50 calendars of 200 rows"""
+    path = tmp_path_factory.mktemp('pages').joinpath('medium.html')
+    return write_page(str(path), 50, 200)
+
+
+@pytest.fixture(scope='module')
+def large_calendar():
+    """A calendar of 100,000 events, already sorted"""
+    cal = make_calendar()
+    cal.events
+    return cal
+
+
+def test_parse_date_speedup():
+    days = [datetime(2017, 1, 1) + timedelta(days=i) for i in range(100)]
+    texts = ['{:%A, %B} {}, {}'.format(day, day.day, day.year)
+             for day in days]
+    for text in texts:
+        nyucal.parse_date(text)
+    check_speedup(
+        'parse_date',
+        lambda: [nyucal.parse_date(text) for text in texts],
+        lambda: [datetime.strptime(text, '%A, %B %d, %Y').date()
+                 for text in texts],
+        number=20)
+
+
+def test_parsed_cache_speedup(medium_page, tmp_path):
+    parsed_cache = ParsedCache(str(tmp_path / 'parsed.sqlite3'))
+    nyucal.CalendarStore(medium_page, parsed_cache=parsed_cache)
+
+    def load(**kwargs):
+        store = nyucal.CalendarStore(medium_page, **kwargs)
+        for _ in store.calendars.values():
+            pass
+
+    check_speedup('parsed_cache', lambda: load(parsed_cache=parsed_cache),
+                  load, repeat=3)
+
+
+def test_artifact_cache_speedup():
+    store = nyucal.CalendarStore(GOLDEN_HTML)
+    cache = ArtifactCache(encodings=['gzip'])
+    cache.get(store, 'Fall 2017', nyucal.IcsWriter)
+    check_speedup(
+        'artifact_cache',
+        lambda: cache.get(store, 'Fall 2017', nyucal.IcsWriter),
+        lambda: cache.render(store.calendars['Fall 2017'], nyucal.IcsWriter),
+        number=20)
+
+
+def test_between_speedup(large_calendar):
+    (start, end) = (date(2000, 1, 1), date(2000, 3, 1))
+    large_calendar.between(start, end)
+    check_speedup('between',
+                  lambda: large_calendar.between(start, end),
+                  lambda: scan_between(large_calendar, start, end))
+
+
+def test_search_speedup(large_calendar):
+    large_calendar.search('reading day')
+    check_speedup('search',
+                  lambda: large_calendar.search('reading day 1234'),
+                  lambda: scan_search(large_calendar, 'reading day 1234'),
+                  repeat=3)
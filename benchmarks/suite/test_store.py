@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of building stores and reading calendars from them."""
+
+import random
+
+from nyucal import nyucal
+
+
+def test_construct_store(benchmark, page_path, backend):
+    benchmark(nyucal.CalendarStore, page_path, backend=backend)
+
+
+def test_calendar_names(benchmark, page_path):
+    """Indexing the tables of a freshly parsed page"""
+    benchmark.pedantic(
+        lambda store: store.calendar_names,
+        setup=lambda: ((nyucal.CalendarStore(page_path),), {}),
+        rounds=10)
+
+
+def test_calendar(benchmark, store):
+    """Parsing the last calendar's table"""
+    benchmark(store.calendar, store.calendar_names[-1])
+
+
+def test_calendar_events_after_adding(benchmark, calendar):
+    """Sorting events that were added out of order"""
+    events = list(calendar.events)
+    random.Random(0).shuffle(events)
+
+    def shuffled_calendar():
+        cal = nyucal.Calendar()
+        cal.add_events(events)
+        return ((cal,), {})
+
+    benchmark.pedantic(lambda cal: cal.events, setup=shuffled_calendar,
+                       rounds=50)
+
+
+def test_calendar_events(benchmark, calendar):
+    """Reading events that are already sorted"""
+    benchmark(lambda: calendar.events)
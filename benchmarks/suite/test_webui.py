@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of the web UI's endpoints, on the golden page."""
+
+import pytest
+
+import webui
+
+from benchmarks.bench_dates import GOLDEN_HTML
+
+
+@pytest.fixture(scope='module')
+def client(request):
+    """A test client for the web UI, with the golden page loaded"""
+    webui.app.config['NYUCAL_SOURCE'] = GOLDEN_HTML
+    webui._refresher = None
+    webui._artifact_cache = None
+    client = webui.app.test_client()
+    assert client.get('/calendars').status_code == 200
+
+    def teardown():
+        webui._refresher.stop(5)
+        webui._refresher = None
+        webui._artifact_cache = None
+
+    request.addfinalizer(teardown)
+    return client
+
+
+@pytest.mark.parametrize('url', [
+    '/calendars',
+    '/calendar/Fall 2017.csv',
+    '/calendar/Fall 2017.ics',
+    '/health',
+    '/metrics',
+])
+def test_get(benchmark, client, url):
+    response = benchmark(client.get, url)
+    assert response.status_code == 200
+
+
+def test_get_calendar_gzipped(benchmark, client):
+    response = benchmark(client.get, '/calendar/Fall 2017.ics',
+                         headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_get_calendar_not_modified(benchmark, client):
+    etag = client.get('/calendar/Fall 2017.ics').headers['ETag']
+    response = benchmark(client.get, '/calendar/Fall 2017.ics',
+                         headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_get_calendar_uncached(benchmark, client):
+    """Rendering the calendar for the request"""
+    def get():
+        webui.get_artifact_cache().clear()
+        return client.get('/calendar/Fall 2017.ics')
+
+    assert benchmark(get).status_code == 200
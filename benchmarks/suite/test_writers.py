@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of writing calendars."""
+
+import io
+
+import pytest
+
+from nyucal import nyucal
+
+
+@pytest.mark.parametrize('writer_class',
+                         [nyucal.GcalCsvWriter, nyucal.IcsWriter],
+                         ids=['gcalcsv', 'ics'])
+def test_write(benchmark, calendar, writer_class):
+    benchmark(lambda: writer_class(io.StringIO()).write(calendar))
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""Synthetic registrar pages for benchmarking.
+
+The pages mimic the markup of the NYU Registrar's academic calendar
+page (see the golden file in `tests/golden`) closely enough for
+:code:`CalendarStore` to parse them, but can be made arbitrarily large.
+"""
+
+from datetime import date, timedelta
+
+PAGE_HEAD = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" \
+"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html><head><title>Academic Calendar</title></head><body>
+"""
+
+PAGE_TAIL = """</body></html>
+"""
+
+TABLE_HEAD = """<table class="regCalendar tRollover print100">
+<thead><tr><td colspan="2"><div class="calTitle">
+{name}
+</div></td></tr></thead>
+<tfoot><tr><td colspan="2">&nbsp;</td></tr></tfoot>
+<tbody>"""
+
+TABLE_TAIL = """</tbody></table>
+"""
+
+# one row template for each way _parse_event_text_cell finds a title
+ROWS = [
+    '<tr><td>{start}&nbsp;</td><td class="a1">{title}<br>'
+    '<span class="normalText">No classes scheduled</span></td></tr>',
+    '<tr><td>{start} -<br>{end}</td><td class="a1"><strong>{title}</strong>'
+    '<br><span class="normalText">The University will be closed.</span>'
+    '</td></tr>',
+    '<tr><td>{start}&nbsp;</td><td class="a1">{title}: '
+    'see your advisor for details</td></tr>',
+    '<tr><td>{start}&nbsp;</td><td class="a1">{title}. '
+    'Fees apply after this date</td></tr>',
+    '<tr><td>{start}&nbsp;</td><td class="a1">{title}</td></tr>',
+]
+
+
+def format_date(day):
+    """Format a date the way the registrar does"""
+    return '{:%A, %B} {}, {}'.format(day, day.day, day.year)
+
+
+def calendar_names(n_calendars):
+    """Names for `n_calendars` synthetic calendars"""
+    terms = ['Fall', 'January Term', 'Spring', 'Summer']
+    return ['{} {}'.format(terms[i % len(terms)], 1000 + i // len(terms))
+            for i in range(n_calendars)]
+
+
+def make_table(name, n_rows, first_day=date(2017, 1, 1)):
+    """Markup for one calendar table with `n_rows` events"""
+    parts = [TABLE_HEAD.format(name=name)]
+    for i in range(n_rows):
+        start = first_day + timedelta(days=i)
+        end = start + timedelta(days=3)
+        parts.append(ROWS[i % len(ROWS)].format(
+            start=format_date(start), end=format_date(end),
+            title='{} event {}'.format(name, i)))
+    parts.append(TABLE_TAIL)
+    return ''.join(parts)
+
+
+def iter_page(n_calendars=9, n_rows=40):
+    """Generate a registrar page of `n_calendars` tables of `n_rows`
+    rows, one table at a time, so pages of any size can be written
+    without holding them in memory"""
+    yield PAGE_HEAD
+    for name in calendar_names(n_calendars):
+        yield make_table(name, n_rows)
+    yield PAGE_TAIL
+
+
+def make_page(n_calendars=9, n_rows=40):
+    """A whole registrar page of `n_calendars` tables of `n_rows` rows"""
+    return ''.join(iter_page(n_calendars, n_rows))
+
+
+def write_page(path, n_calendars=9, n_rows=40):
+    """Write a synthetic page to the file at `path`"""
+    with open(path, 'w') as page_file:
+        for part in iter_page(n_calendars, n_rows):
+            page_file.write(part)
+    return path
+
+
+def main(argv=None):
+    """Write a synthetic page to a file or stdout:
+
+        python -m benchmarks.synthetic N_CALENDARS N_ROWS [PATH]
+    """
+    import sys
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) not in (2, 3):
+        sys.exit(main.__doc__)
+    (n_calendars, n_rows) = (int(args[0]), int(args[1]))
+    if len(args) == 3:
+        write_page(args[2], n_calendars, n_rows)
+    else:
+        for part in iter_page(n_calendars, n_rows):
+            sys.stdout.write(part)
+
+
+if __name__ == '__main__':
+    main()
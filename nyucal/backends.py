@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""HTML parser backends for :code:`CalendarStore`.
+
+.. default-role:: code
+
+A backend knows how to turn a registrar page into a document, find the
+calendar tables in it, and split a table into rows of cells.  The cells
+it hands back must support the small part of the |lxml.html|_ element
+API that :code:`CalendarStore` uses on them: `text`, `find('br').tail`,
+`findtext(tag)` and `text_content()`.
+
+Two backends are provided:
+
+`lxml`
+    The default, using |lxml.html|_ with XPath expressions compiled
+    once.
+
+`selectolax`
+    Using selectolax_'s Lexbor parser, if it is installed.
+
+.. |lxml.html| replace:: :code:`lxml.html`
+.. _lxml.html: http://lxml.de/lxmlhtml.html
+.. _selectolax: https://github.com/rushter/selectolax
+"""
+
+import io
+
+
+class LxmlBackend(object):
+    """Parse with :code:`lxml.html`"""
+
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree, html
+        self._html = html
+        self._titles = etree.XPath('//div[@class="calTitle"]')
+        self._ancestor_tables = etree.XPath('ancestor::table')
+        self._rows = etree.XPath('tbody/tr')
+        self._cells = etree.XPath('td')
+
+    def parse(self, source):
+        """Parse a file path or file object.
+
+        Raises :code:`OSError` if `source` is not a readable file."""
+        return self._html.parse(source)
+
+    def parse_string(self, text):
+        """Parse a string of HTML"""
+        return self._html.parse(io.StringIO(text))
+
+    def tables(self, document):
+        """Generate `(name, table)` pairs, in document order"""
+        for elt in self._titles(document):
+            yield (elt.text.strip(), self._ancestor_tables(elt)[0])
+
+    def rows(self, table):
+        """Generate `(date_cell, text_cell)` pairs for a table's rows"""
+        cells = self._cells
+        for row in self._rows(table):
+            (date_cell, text_cell) = cells(row)[:2]
+            yield (date_cell, text_cell)
+
+
+class SelectolaxBackend(object):
+    """Parse with selectolax's Lexbor parser.
+
+    Cells are wrapped in :code:`SelectolaxCell` so they look enough like
+    :code:`lxml.html` elements for the cell parsers.
+    """
+
+    name = 'selectolax'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def parse(self, source):
+        """Parse a file path or file object.
+
+        Raises :code:`OSError` if `source` is not a readable file."""
+        if hasattr(source, 'read'):
+            return self._parser(source.read())
+        try:
+            with open(source, 'rb') as source_file:
+                return self._parser(source_file.read())
+        except ValueError as e:
+            # e.g. a blob of HTML with a NUL in it
+            raise OSError(str(e))
+
+    def parse_string(self, text):
+        """Parse a string of HTML"""
+        return self._parser(text)
+
+    def tables(self, document):
+        """Generate `(name, table)` pairs, in document order"""
+        for elt in document.css('div'):
+            if elt.attributes.get('class') != 'calTitle':
+                continue
+            table = None
+            parent = elt.parent
+            while parent is not None:
+                # like lxml's ancestor::table[0], take the outermost
+                if parent.tag == 'table':
+                    table = parent
+                parent = parent.parent
+            yield (elt.text(deep=False).strip(), table)
+
+    def rows(self, table):
+        """Generate `(date_cell, text_cell)` pairs for a table's rows"""
+        for tbody in _children(table, 'tbody'):
+            for row in _children(tbody, 'tr'):
+                cells = list(_children(row, 'td'))
+                yield (SelectolaxCell(cells[0]), SelectolaxCell(cells[1]))
+
+
+def _children(node, tag):
+    """Child elements of a selectolax node with the given tag"""
+    child = node.child
+    while child is not None:
+        if child.tag == tag:
+            yield child
+        child = child.next
+
+
+class SelectolaxCell(object):
+    """An lxml-like view of a selectolax element"""
+
+    __slots__ = ['_node']
+
+    def __init__(self, node):
+        self._node = node
+
+    @property
+    def text(self):
+        """Text before the first child element, or `None`"""
+        parts = []
+        child = self._node.child
+        while child is not None and child.tag == '-text':
+            parts.append(child.text_content)
+            child = child.next
+        return ''.join(parts) or None
+
+    @property
+    def tail(self):
+        """Text after this element, up to the next element, or `None`"""
+        parts = []
+        sibling = self._node.next
+        while sibling is not None and sibling.tag == '-text':
+            parts.append(sibling.text_content)
+            sibling = sibling.next
+        return ''.join(parts) or None
+
+    def find(self, tag):
+        """The first child element with the given tag, or `None`"""
+        for child in _children(self._node, tag):
+            return SelectolaxCell(child)
+        return None
+
+    def findtext(self, tag):
+        """The text of the first child element with the given tag
+        (`''` if it has none), or `None` if there is no such child"""
+        child = self.find(tag)
+        if child is None:
+            return None
+        return child.text or ''
+
+    def text_content(self):
+        """All the text inside this element"""
+        return self._node.text(deep=True)
+
+
+backends = {
+    'lxml': LxmlBackend,
+    'selectolax': SelectolaxBackend,
+}
+"""Backend classes, by name"""
+
+_instances = {}
+
+
+def get_backend(backend=None):
+    """Get a backend by name (default: `lxml`).
+
+    A backend object is passed through unchanged.  Raises
+    :code:`ImportError` if the backend's parser is not installed."""
+    if backend is None:
+        backend = 'lxml'
+    if not isinstance(backend, str):
+        return backend
+    try:
+        return _instances[backend]
+    except KeyError:
+        pass
+    instance = backends[backend]()
+    return _instances.setdefault(backend, instance)
+
+
+def available_backends():
+    """Names of the backends whose parsers are installed"""
+    names = []
+    for name in backends:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
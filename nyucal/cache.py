@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+
+"""Caches for calendar stores.
+
+.. default-role:: code
+
+"""
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+from nyucal import metrics, nyucal
+
+log = logging.getLogger(__name__)
+
+_artifact_lookups = metrics.counter(
+    'nyucal_artifact_cache_lookups_total',
+    'Lookups in the rendered-calendar cache', ['result'])
+
+
+class StoreUnavailable(RuntimeError):
+    """No store has been loaded yet"""
+
+
+Snapshot = namedtuple('Snapshot', ['store', 'loaded_at', 'loaded_time'])
+"""A store loaded by :code:`StoreRefresher`, with when it was loaded,
+by the refresher's clock and by the wall clock."""
+
+
+class StoreRefresher(object):
+    """Keeps a current |CalendarStore| loaded by a background thread.
+
+    Every `interval` seconds the thread builds a new store and parses
+    all its calendars, then swaps it in with a single assignment, so
+    readers always see a complete snapshot and never wait for the
+    registrar.  If a refresh fails, the previous snapshot is kept and
+    the error is reported by :code:`status`.  A refresh fails if the
+    source can't be fetched, including when the server answers with an
+    error, and if it has no calendars when the previous snapshot had
+    some.  A snapshot older than `stale_after` seconds (default: three
+    intervals) is reported as stale too, even if no refresh has failed,
+    say because one is stuck waiting on a slow registrar.
+
+    .. |CalendarStore| replace:: :code:`CalendarStore`
+    """
+
+    def __init__(self, source=nyucal.SOURCE_URL, interval=300, factory=None,
+                 clock=time.monotonic, stale_after=None):
+        self.source = source
+        self.interval = interval
+        self.stale_after = stale_after if stale_after is not None \
+            else 3 * interval
+        self.factory = factory if factory is not None else nyucal.CalendarStore
+        self._clock = clock
+        self._snapshot = None
+        self._loaded = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_attempt = None
+
+    def start(self):
+        """Start the background thread, if it isn't running already"""
+        with self._lock:
+            if self._thread is not None:
+                return self._thread
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='nyucal-refresher')
+            self._thread.daemon = True
+            self._thread.start()
+            return self._thread
+
+    def stop(self, timeout=None):
+        """Stop the background thread after any refresh in progress"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.refresh()
+            self._stopping.wait(self.interval)
+
+    def refresh(self):
+        """Load a new snapshot now.  Returns whether it succeeded."""
+        self.last_attempt = self._clock()
+        try:
+            store = self.factory(self.source)
+            previous = self._snapshot
+            if (not store.calendars and previous is not None
+                    and previous.store.calendars):
+                raise ValueError('no calendars found in {}'.format(
+                    self.source))
+            # parse everything here, so readers never have to
+            for _ in store.calendars.values():
+                pass
+        except Exception as e:
+            log.exception('refreshing %s failed; keeping the last snapshot',
+                          self.source)
+            self.failures += 1
+            self.last_error = '{}: {}'.format(type(e).__name__, e)
+            return False
+        self._snapshot = Snapshot(store, self._clock(), time.time())
+        self.refreshes += 1
+        self.last_error = None
+        self._loaded.set()
+        return True
+
+    def get(self, timeout=None):
+        """Get the current store.
+
+        If none has been loaded yet, wait up to `timeout` seconds (or
+        for ever, if it is `None`) for the first one, then raise
+        :code:`StoreUnavailable`."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self._loaded.wait(timeout)
+            snapshot = self._snapshot
+            if snapshot is None:
+                raise StoreUnavailable(
+                    'no calendars loaded from {} yet'.format(self.source))
+        return snapshot.store
+
+    @property
+    def age(self):
+        """Seconds since the current snapshot was loaded, or `None`"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return self._clock() - snapshot.loaded_at
+
+    def status(self):
+        """How the refresher is doing, as a JSON-serializable dict.
+
+        Its `status` is `'ok'` if the last refresh worked, `'stale'` if
+        it failed, or the snapshot is older than `stale_after`, but a
+        snapshot is being served, `'starting'` before the first refresh
+        has finished, and `'error'` if no refresh has worked yet.
+        `since_attempt` is the number of seconds since the last refresh
+        started, whether or not it has finished."""
+        snapshot = self._snapshot
+        age = self.age
+        last_attempt = self.last_attempt
+        if snapshot is None:
+            status = 'error' if self.last_error else 'starting'
+        elif self.last_error or age > self.stale_after:
+            status = 'stale'
+        else:
+            status = 'ok'
+        return {
+            'status': status,
+            'source': self.source,
+            'age': age,
+            'since_attempt': (None if last_attempt is None
+                              else self._clock() - last_attempt),
+            'stale_after': self.stale_after,
+            'loaded': None if snapshot is None else snapshot.loaded_time,
+            'digest': None if snapshot is None else snapshot.store.digest,
+            'interval': self.interval,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+CachedResponse = namedtuple('CachedResponse', ['text', 'digest', 'fresh'])
+"""Result of :code:`HttpCache.fetch`.
+
+`text` is the response body, `digest` its SHA-256 hex digest, and
+`fresh` is false when the server answered `304 Not Modified` and the
+body came from the cache."""
+
+
+class HttpCache(object):
+    """On-disk cache of HTTP response bodies, keyed by URL.
+
+    Cached responses are revalidated with `If-None-Match` and
+    `If-Modified-Since`, so an unchanged page costs a `304` round trip
+    rather than a full download.  Each URL is stored as a pair of files
+    in `directory`: the body, and a small JSON file of validators and
+    the body's digest.
+    """
+
+    def __init__(self, directory, session=None):
+        """Initializer
+
+        Requests are made with `session` (default: the shared one from
+        :code:`nyucal.sessions.default_session`)."""
+        self.directory = directory
+        if session is None:
+            from nyucal.sessions import default_session
+            session = default_session()
+        self.session = session
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return (base + '.json', base + '.html')
+
+    def _read(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, encoding='utf-8',
+                      newline='') as body_file:
+                body = body_file.read()
+        except (IOError, OSError, ValueError):
+            return (None, None)
+        return (meta, body)
+
+    def _write(self, url, meta, body):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        meta_path, body_path = self._paths(url)
+        _atomic_write(body_path, body, self.directory)
+        _atomic_write(meta_path, json.dumps(meta), self.directory)
+
+    def fetch(self, url):
+        """Get the body of `url`, revalidating any cached copy.
+
+        If the server answers with an error, the cached copy is returned
+        as if it had not been modified; with no cached copy, the error
+        is raised as a :code:`requests.HTTPError`."""
+        meta, body = self._read(url)
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        response = self.session.get(url, headers=headers)
+        if response.status_code == 304 and meta is not None:
+            log.debug('%s not modified', url)
+            return CachedResponse(body, meta['digest'], False)
+        if not response.ok:
+            # don't let an error page displace, or stand in for, a good
+            # cached copy
+            if meta is not None:
+                log.warning('%s: %s %s; using the cached copy', url,
+                            response.status_code, response.reason)
+                return CachedResponse(body, meta['digest'], False)
+            response.raise_for_status()
+        text = response.text
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        meta = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'digest': digest
+        }
+        self._write(url, meta, text)
+        return CachedResponse(text, digest, True)
+
+
+class ParsedCache(object):
+    """SQLite cache of parsed calendars, keyed by source content digest.
+
+    Each entry holds every calendar parsed from one source, and is
+    stamped with :code:`nyucal.PARSER_VERSION`; entries from other
+    parser versions are never returned, and are deleted when the cache
+    is opened.  Only the `max_entries` most recently stored sources are
+    kept.
+    """
+
+    def __init__(self, path, max_entries=16,
+                 parser_version=nyucal.PARSER_VERSION):
+        self.path = path
+        self.max_entries = max_entries
+        self.parser_version = parser_version
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS parsed ('
+                       ' digest TEXT PRIMARY KEY,'
+                       ' version INTEGER NOT NULL,'
+                       ' stored REAL NOT NULL,'
+                       ' data BLOB NOT NULL)')
+            db.execute('DELETE FROM parsed WHERE version != ?',
+                       (self.parser_version,))
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection and commit (or roll back) when done.
+
+        Each operation has its own connection, so the cache can be
+        shared between threads and processes."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, digest):
+        """Get the calendars parsed from a source with this digest.
+
+        Returns a list of `(name, events)` pairs, where `events` is a list
+        of `(start, end, name, description)` tuples, or `None` if there
+        is no such entry."""
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT data FROM parsed WHERE digest = ? AND version = ?',
+                (digest, self.parser_version)).fetchone()
+        if row is None:
+            return None
+        fromordinal = date.fromordinal
+        return [(name, [(fromordinal(start),
+                         None if end is None else fromordinal(end),
+                         event_name, description)
+                        for (start, end, event_name, description) in events])
+                for (name, events) in json.loads(
+                    zlib.decompress(row[0]).decode('utf-8'))]
+
+    def put(self, digest, calendars):
+        """Store the calendars parsed from a source with this digest"""
+        data = [[calendar.name,
+                 [[event.start.toordinal(),
+                   None if event.end is None else event.end.toordinal(),
+                   event.name, event.description]
+                  for event in calendar.events]]
+                for calendar in calendars]
+        blob = zlib.compress(json.dumps(data).encode('utf-8'))
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO parsed VALUES (?, ?, ?, ?)',
+                       (digest, self.parser_version, time.time(),
+                        sqlite3.Binary(blob)))
+            db.execute('DELETE FROM parsed WHERE digest NOT IN ('
+                       ' SELECT digest FROM parsed'
+                       ' ORDER BY stored DESC LIMIT ?)',
+                       (self.max_entries,))
+
+
+Artifact = namedtuple('Artifact', ['body', 'etag', 'encoded'])
+"""A calendar rendered by :code:`ArtifactCache`.
+
+`body` is the rendered calendar as UTF-8 bytes and `etag` a strong
+entity tag for it (without the quotes).  `encoded` maps content-coding
+names, such as `'gzip'`, to the body compressed with them."""
+
+
+def _brotli(body):
+    import brotli
+    return brotli.compress(body)
+
+
+compressors = OrderedDict([
+    ('br', _brotli),
+    ('gzip', lambda body: gzip.compress(body, mtime=0)),
+])
+"""Functions compressing a body with each content coding, best first"""
+
+
+def available_encodings():
+    """Names of the content codings whose compressors are installed.
+
+    Brotli needs the optional `brotli` package."""
+    names = []
+    for name in compressors:
+        if name == 'br':
+            try:
+                import brotli  # noqa: F401
+            except ImportError:
+                continue
+        names.append(name)
+    return names
+
+
+class ArtifactCache(object):
+    """In-memory cache of rendered calendars.
+
+    A calendar is rendered by each writer class at most once per version
+    of its source, then kept with its ETag and its compressed variants.
+    The version of a source is the store's digest; a store with no
+    digest (say, one read from a file) is its own version.  The
+    `max_entries` most recently used artifacts are kept.
+
+    An artifact's bytes, compressed or not, depend only on the calendar:
+    ICS files are all stamped with the same :code:`stamp` rather than
+    the time they were rendered.  So the ETag, a digest of the body, is
+    the same in every process and after the artifact is evicted, and
+    clients revalidating it keep getting `304`.
+    """
+
+    stamp = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    """The :code:`DTSTAMP` of every ICS file rendered"""
+
+    def __init__(self, max_entries=64, encodings=None, stamp=None):
+        """Initializer
+
+        `encodings` are the content codings to compress artifacts with
+        (default: all of :code:`available_encodings()`).  `stamp`
+        replaces the default :code:`stamp`."""
+        self.max_entries = max_entries
+        if encodings is None:
+            encodings = available_encodings()
+        self.encodings = list(encodings)
+        if stamp is not None:
+            self.stamp = stamp
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, store, name, writer_class):
+        """Get the artifact for calendar `name` of `store` written by
+        `writer_class`, rendering it if needed.
+
+        Raises :code:`KeyError` if there is no calendar by that name."""
+        version = store.digest
+        key = (version if version is not None else id(store),
+               name, writer_class)
+        with self._lock:
+            entry = self._entries.get(key)
+            # an id may be reused once its store is gone, so entries
+            # keyed by id keep their store to check against
+            if entry is not None and (version is not None
+                                      or entry[0] is store):
+                self._entries.move_to_end(key)
+                _artifact_lookups.labels('hit').inc()
+                return entry[1]
+        _artifact_lookups.labels('miss').inc()
+        artifact = self.render(store.calendars[name], writer_class)
+        with self._lock:
+            self._entries[key] = (store if version is None else None,
+                                  artifact)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return artifact
+
+    def render(self, calendar, writer_class):
+        """Render `calendar` into an :code:`Artifact`"""
+        buffer = io.StringIO()
+        if issubclass(writer_class, nyucal.IcsWriter):
+            writer = writer_class(buffer, stamp=self.stamp)
+        else:
+            writer = writer_class(buffer)
+        writer.write(calendar)
+        body = buffer.getvalue().encode('utf-8')
+        return Artifact(body, hashlib.sha256(body).hexdigest()[:32],
+                        {encoding: compressors[encoding](body)
+                         for encoding in self.encodings})
+
+    def clear(self):
+        """Forget every artifact"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _atomic_write(path, text, directory):
+    """Write `text` to `path` so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with open(fd, 'w', encoding='utf-8', newline='') as tmp_file:
+            tmp_file.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
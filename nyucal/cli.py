@@ -10,45 +10,139 @@ See the sphinx-click_ plugin.
 .. _sphinx-click: https://github.com/click-contrib/sphinx-click
 """
 
+import json
+import os.path
+
 import click
 
-from nyucal import nyucal
+from nyucal import metrics, nyucal, utils
+from nyucal.cache import HttpCache, ParsedCache
+from nyucal.diff import diff_stores
+
+
+writers = {
+    'gcalcsv': nyucal.GcalCsvWriter,
+    'ics': nyucal.IcsWriter
+    }
+"""Writer classes, by format name"""
+
+extensions = {
+    'gcalcsv': 'csv',
+    'ics': 'ics'
+    }
+"""File extensions, by format name"""
+
+
+source_option = click.option(
+    '--source', '-s', 'sources', multiple=True, default=[nyucal.SOURCE_URL],
+    help="""Calendars source (URL, file path, or string).  Repeat to
+    merge several sources, collapsing duplicate events.
+    (default: {} """.format(nyucal.SOURCE_URL))
+
+
+cache_dir_option = click.option(
+    '--cache-dir', envvar='NYUCAL_CACHE_DIR', default=None,
+    type=click.Path(file_okay=False),
+    help="""Cache downloaded sources and parsed calendars in this
+    directory; sources are revalidated with conditional requests, and
+    unchanged sources are not parsed again (env: NYUCAL_CACHE_DIR)""")
+
+
+def open_store(sources, cache_dir=None):
+    """Build the calendar store for `sources`, merging them if there is
+    more than one, and going through the on-disk HTTP and
+    parsed-calendar caches if `cache_dir` is given."""
+    source = sources[0] if len(sources) == 1 else sources
+    if not cache_dir:
+        return nyucal.CalendarStore(source)
+    return nyucal.CalendarStore(
+        source, http_cache=HttpCache(cache_dir),
+        parsed_cache=ParsedCache(os.path.join(cache_dir, 'parsed.sqlite3')))
 
 
 @click.group()
-def main(args=None):
+@click.option('--stats', is_flag=True,
+              help='Print timings and counts of each stage when done')
+@click.option('--profile', envvar='NYUCAL_PROFILE',
+              type=click.Choice(['cprofile', 'sample']), default=None,
+              help="""Profile the command: with cProfile, printing the
+              hottest functions, or by sampling the stack, writing
+              collapsed stacks for flame graphs (env: NYUCAL_PROFILE)""")
+@click.option('--profile-output', type=click.Path(dir_okay=False),
+              default=None,
+              help="""Write the profile to this file: cProfile stats
+              (default: none), or collapsed stacks (default:
+              nyucal.collapsed)""")
+def main(stats, profile, profile_output):
     """Console script for nyucal."""
-    pass
+    ctx = click.get_current_context()
+    if stats:
+        metrics.enable()
+        ctx.call_on_close(print_stats)
+    if profile == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        ctx.call_on_close(
+            lambda: finish_cprofile(profiler, profile_output))
+    elif profile == 'sample':
+        sampler = utils.SamplingProfiler(all_threads=True)
+        sampler.start()
+        ctx.call_on_close(
+            lambda: finish_sampling(sampler,
+                                    profile_output or 'nyucal.collapsed'))
+
+
+def print_stats():
+    """Print the metrics recorded, to stderr"""
+    click.echo(metrics.summary(), err=True, nl=False)
+
+
+def finish_cprofile(profiler, path):
+    """Stop `profiler`, print its report to stderr, and save its stats
+    to `path`, if given"""
+    profiler.disable()
+    click.echo(utils.profile_report(profiler), err=True, nl=False)
+    if path:
+        profiler.dump_stats(path)
+
+
+def finish_sampling(sampler, path):
+    """Stop `sampler`, print its report to stderr, and write its
+    collapsed stacks to `path`"""
+    sampler.stop()
+    with open(path, 'w') as output:
+        output.write(sampler.collapsed())
+    click.echo(sampler.report(), err=True, nl=False)
+    click.echo('Collapsed stacks written to {}'.format(path), err=True)
 
 
 @main.command()
-@click.option('--source', '-s', default=nyucal.SOURCE_URL,
-              help="""Calendars source (URL, file path, or string).
-              (default: {} """.format(nyucal.SOURCE_URL))
-def list(source):
+@source_option
+@cache_dir_option
+def list(sources, cache_dir):
     """List the available calendars in the calendar source
 
     Since the calendar store is, by default, scraped from a web page,
     this command will fail if no source is specified and the computer
     is not online.
     """
-    store = nyucal.CalendarStore(source)
+    store = open_store(sources, cache_dir)
     for line in store.calendar_names:
         click.echo(line)
 
 
 @main.command()
 @click.argument('name', nargs=1)
-@click.option('--source', '-s', default=nyucal.SOURCE_URL,
-              help="""Calendars source (URL, file path, or string).
-              (default: {} """.format(nyucal.SOURCE_URL))
+@source_option
 @click.option('--format', '-f',
-              type=click.Choice(['gcalcsv','ics']),
+              type=click.Choice(sorted(writers)),
               default='gcalcsv',
               help='Write in this format')
 @click.option('--output', '-o', type=click.File('w'), default='-',
               help='Write to this file (default: stdout)')
-def get(source, name, format, output):
+@cache_dir_option
+def get(sources, name, format, output, cache_dir):
     """Get the calendar named NAME and output in the specified format
 
     If NAME contains a space, it will need to be quoted.
@@ -57,15 +151,115 @@ def get(source, name, format, output):
     this command will fail if no source is specified and the computer
     is not online.
     """
-    store = nyucal.CalendarStore(source)
-    calendar = store.calendar(name)
-    writers = {
-        'gcalcsv': nyucal.GcalCsvWriter,
-        'ics': nyucal.IcsWriter
-        }
+    store = open_store(sources, cache_dir)
+    calendar = store.calendars[name]
     writer = writers[format.lower()](output)
     writer.write(calendar)
 
 
+def write_calendar(calendar, format, path):
+    """Write `calendar` to the file at `path` in the given format"""
+    with open(path, 'w') as output:
+        writers[format](output).write(calendar)
+    return path
+
+
+@main.command('export-all')
+@source_option
+@click.option('--format', '-f', 'formats', multiple=True,
+              type=click.Choice(sorted(writers)),
+              help='Write in this format (repeatable; default: all)')
+@click.option('--output-dir', '-d', default='.',
+              type=click.Path(file_okay=False),
+              help='Write files into this directory (default: .)')
+@click.option('--jobs', '-j', default=4, type=click.IntRange(min=1),
+              help='Number of files to write at once (default: 4)')
+@cache_dir_option
+def export_all(sources, formats, output_dir, jobs, cache_dir):
+    """Export every calendar in every requested format
+
+    The source is fetched and parsed once.  Each calendar is written to
+    OUTPUT_DIR/NAME.EXT (e.g. `Fall 2017.csv`), and the paths written
+    are listed as they finish.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    if not formats:
+        formats = sorted(writers)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    store = open_store(sources, cache_dir)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        # calendars are parsed one at a time here, while earlier ones
+        # are being written by the pool
+        for name, calendar in store.calendars.items():
+            filename = name.replace(os.sep, '-')
+            for format in formats:
+                path = os.path.join(
+                    output_dir, '{}.{}'.format(filename, extensions[format]))
+                futures.append(executor.submit(
+                    write_calendar, calendar, format, path))
+        for future in as_completed(futures):
+            click.echo(future.result())
+
+
+def describe_event(event):
+    """One line describing an event, for `nyucal diff`"""
+    if event.end is None:
+        dates = '{}'.format(event.start)
+    else:
+        dates = '{} - {}'.format(event.start, event.end)
+    return '{}  {}'.format(dates, event.name)
+
+
+def event_json(uid, event):
+    """An event as a JSON-serializable dict, for `nyucal diff --json`"""
+    return {
+        'uid': uid,
+        'start': None if event.start is None else event.start.isoformat(),
+        'end': None if event.end is None else event.end.isoformat(),
+        'name': event.name,
+        'description': event.description,
+    }
+
+
+@main.command()
+@click.argument('old')
+@click.argument('new')
+@click.option('--json', 'as_json', is_flag=True,
+              help='Write the changes as JSON')
+@cache_dir_option
+def diff(old, new, as_json, cache_dir):
+    """Show how the calendars changed from source OLD to source NEW
+
+    Events are matched by the UIDs they get in ICS files.  For each
+    calendar that changed, added events are listed with `+`, removed
+    ones with `-`, and ones whose description changed with `~`.  Like
+    diff(1), exits with status 1 if anything changed, and 0 if not.
+    """
+    diffs = diff_stores(open_store((old,), cache_dir),
+                        open_store((new,), cache_dir))
+    if as_json:
+        click.echo(json.dumps([
+            {'calendar': d.name,
+             'added': [event_json(uid, e) for (uid, e) in d.added],
+             'removed': [event_json(uid, e) for (uid, e) in d.removed],
+             'modified': [{'old': event_json(uid, old_event),
+                           'new': event_json(uid, new_event)}
+                          for (uid, old_event, new_event) in d.modified]}
+            for d in diffs], indent=2))
+    else:
+        for d in diffs:
+            click.echo(d.name)
+            for (_, event) in d.added:
+                click.echo('+ ' + describe_event(event))
+            for (_, event) in d.removed:
+                click.echo('- ' + describe_event(event))
+            for (_, _, event) in d.modified:
+                click.echo('~ ' + describe_event(event))
+    if diffs:
+        click.get_current_context().exit(1)
+
+
 if __name__ == "__main__":
     main()
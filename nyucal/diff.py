@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""Changes between two snapshots of the calendars.
+
+.. default-role:: code
+
+Events are matched by the UIDs :code:`IcsWriter` gives them (see
+:code:`nyucal.event_uids`), so a change found here is a change a
+calendar application subscribed to the ICS feed would see: an event
+that moves to other dates, or is renamed, is removed and added again,
+and an event whose description changes is modified.
+"""
+from collections import namedtuple
+
+from nyucal import nyucal
+
+CalendarDiff = namedtuple('CalendarDiff',
+                          ['name', 'added', 'removed', 'modified'])
+"""Changes to one calendar.
+
+`added` and `removed` are lists of `(uid, event)` pairs, and `modified`
+a list of `(uid, old event, new event)` triples, each in calendar
+order."""
+
+
+def _record(event):
+    return (event.start, event.end, event.name, event.description)
+
+
+def diff_calendars(old, new, name=None):
+    """Compare two versions of a calendar, returning a
+    :code:`CalendarDiff`, or `None` if nothing changed.
+
+    Either may be `None`, for a calendar that was added or removed.
+    `name` defaults to the calendar's name.
+    """
+    if name is None:
+        name = (new if new is not None else old).name
+    old_events = old.events if old is not None else []
+    new_events = new.events if new is not None else []
+    if (old is not None and new is not None
+            and list(map(_record, old_events)) ==
+            list(map(_record, new_events))):
+        return None
+    old_uids = dict(nyucal.event_uids(old_events, name))
+    added = []
+    modified = []
+    for (uid, event) in nyucal.event_uids(new_events, name):
+        old_event = old_uids.pop(uid, None)
+        if old_event is None:
+            added.append((uid, event))
+        elif _record(old_event) != _record(event):
+            modified.append((uid, old_event, event))
+    # what's left wasn't matched; dicts keep the calendar's order
+    removed = list(old_uids.items())
+    return CalendarDiff(name, added, removed, modified)
+
+
+def diff_stores(old, new):
+    """Compare two snapshots of the calendars.
+
+    Returns a list of :code:`CalendarDiff`, one for each calendar that
+    changed, was added or was removed: calendars in `new` in its order,
+    then those only in `old`.  Unchanged calendars are left out, so
+    only their feeds need writing again.
+
+    If both stores know the digest of their source and it is the same,
+    nothing is parsed.
+    """
+    if old.digest is not None and old.digest == new.digest:
+        return []
+    diffs = []
+    for name in new.calendar_names:
+        old_calendar = old.calendars[name] if name in old.calendars else None
+        diff = diff_calendars(old_calendar, new.calendars[name], name)
+        if diff is not None:
+            diffs.append(diff)
+    for name in old.calendar_names:
+        if name not in new.calendars:
+            diffs.append(diff_calendars(old.calendars[name], None, name))
+    return diffs
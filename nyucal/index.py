@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""Indexes for querying a calendar's events.
+
+.. default-role:: code
+
+An :code:`EventIndex` answers two kinds of question about a list of
+events without scanning all of it:
+
+- which events fall between two dates, through the events' start dates
+  kept in order, searched by bisection; and
+- which events mention some words, through an inverted index from each
+  word in an event's name or description to the events that use it.
+
+:code:`Calendar.between` and :code:`Calendar.search` build one the first
+time they are called, and again after events are added.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+import re
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """The lowercase words in `text`"""
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+class EventIndex(object):
+    """Date-range and word index over a list of events.
+
+    `events` must already be sorted by :code:`nyucal.event_sort_key`.
+    Both queries return events in that order.
+    """
+
+    def __init__(self, events):
+        self._events = events
+        # events with no start date sort first, and are never found
+        # by date
+        self._first_dated = 0
+        while (self._first_dated < len(events)
+               and events[self._first_dated].start is None):
+            self._first_dated += 1
+        self._starts = [event.start for event in events[self._first_dated:]]
+        self._longest = max(
+            [(event.end or event.start) - event.start
+             for event in events[self._first_dated:]] or [timedelta(0)])
+        self._postings = {}
+        for (position, event) in enumerate(events):
+            for token in set(tokenize(event.name)
+                             + tokenize(event.description)):
+                self._postings.setdefault(token, []).append(position)
+
+    def between(self, start=None, end=None):
+        """Events on any day from `start` to `end`, inclusive.
+
+        An event is on the days from its start date to its end date (or
+        just its start date, if it has no end date).  A bound of `None`
+        leaves that side of the range open.
+
+        The events starting before `end` are found by bisection; only
+        those starting no earlier than the longest event before `start`
+        are then looked at, so a query takes `O(log n + k)` time for
+        `k` results, as long as events are short compared with the
+        calendar, as academic calendar events are.
+        """
+        starts = self._starts
+        hi = len(starts) if end is None else bisect_right(starts, end)
+        if start is None:
+            lo = 0
+        else:
+            lo = bisect_left(starts, start - self._longest, 0, hi)
+        offset = self._first_dated
+        return [event for event in self._events[offset + lo:offset + hi]
+                if start is None or (event.end or event.start) >= start]
+
+    def search(self, text):
+        """Events whose name or description has every word in `text`.
+
+        Matching ignores case and punctuation, and words must match
+        whole: `'reading day'` finds "Reading Day" but `'read'` does
+        not.  The posting lists of the words are intersected, starting
+        with the shortest, so a query takes time in proportion to the
+        number of events using its rarest word: each of those is looked
+        up in much longer (sorted) posting lists by bisection.
+        """
+        tokens = set(tokenize(text))
+        if not tokens:
+            return []
+        postings = sorted((self._postings.get(token, []) for token in tokens),
+                          key=len)
+        found = postings[0]
+        for positions in postings[1:]:
+            if len(positions) > 8 * len(found):
+                found = [position for position in found
+                         if _contains(positions, position)]
+            else:
+                common = set(positions)
+                found = [position for position in found
+                         if position in common]
+        return [self._events[position] for position in found]
+
+
+def _contains(positions, position):
+    """Whether the sorted list `positions` has `position`"""
+    i = bisect_left(positions, position)
+    return i < len(positions) and positions[i] == position
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+"""Counters, histograms and timers for the stages of making calendars.
+
+.. default-role:: code
+
+Metrics are only recorded while they are enabled, with :code:`enable`.
+While they are disabled, which is the default, updating a metric costs
+one function call and one test of a flag, so instrumentation can stay
+in the code, and metrics can stay on in production.
+
+:code:`render` writes every metric in the Prometheus_ text format, and
+:code:`summary` as a table for people.
+
+    >>> requests = counter('example_requests_total', 'Requests served')
+    >>> enable()
+    >>> requests.inc()
+    >>> print(render_metric(requests), end='')
+    # HELP example_requests_total Requests served
+    # TYPE example_requests_total counter
+    example_requests_total 1
+    >>> disable()
+
+.. _Prometheus: https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+from bisect import bisect_left
+from collections import OrderedDict
+import threading
+from time import perf_counter
+
+_enabled = False
+
+
+def enable():
+    """Start recording metrics"""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording metrics.  Values recorded so far are kept."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """Whether metrics are being recorded"""
+    return _enabled
+
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Default histogram bucket bounds, in seconds"""
+
+
+class _Metric(object):
+    """A metric, with a value for each combination of label values.
+
+    A metric without labels is its own only value; with labels, call
+    :code:`labels` to get the value for some label values."""
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The value for these label values"""
+        try:
+            return self._values[values]
+        except KeyError:
+            pass
+        with self._lock:
+            return self._values.setdefault(values, self._new_value())
+
+    def reset(self):
+        """Forget every value recorded"""
+        with self._lock:
+            self._values.clear()
+
+    def values(self):
+        """`(label values, value)` pairs, in the order first seen"""
+        with self._lock:
+            return list(self._values.items())
+
+
+class _CounterValue(object):
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Add `amount` to the counter"""
+        if not _enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """A count that only goes up"""
+
+    kind = 'counter'
+    _new_value = _CounterValue
+
+    def inc(self, amount=1):
+        """Add `amount` to the counter"""
+        if not _enabled:
+            return
+        self.labels().inc(amount)
+
+
+class _HistogramValue(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # counts[i] is the number of observations in bucket i alone;
+        # the last is for those larger than every bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation"""
+        if not _enabled:
+            return
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """A context manager recording, in seconds, how long its block
+        takes, unless the block raises."""
+        return _Timer(self) if _enabled else _null_timer
+
+
+class _Timer(object):
+    """Times a block into anything with an `observe` method"""
+
+    __slots__ = ['_value', '_start']
+
+    def __init__(self, value):
+        self._value = value
+
+    def __enter__(self):
+        self._start = perf_counter() if _enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._start is not None and exc_type is None:
+            self._value.observe(perf_counter() - self._start)
+
+
+class _NullTimer(object):
+    """Times nothing, for when metrics are disabled"""
+
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+class Histogram(_Metric):
+    """A distribution of observations, such as durations, in buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        """Record one observation"""
+        if not _enabled:
+            return
+        self.labels().observe(value)
+
+    def time(self):
+        """A context manager recording how long its block takes"""
+        return _Timer(self) if _enabled else _null_timer
+
+
+registry = OrderedDict()
+"""Every metric, by name"""
+
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, *args, **kwargs):
+    with _registry_lock:
+        metric = registry.get(name)
+        if metric is None:
+            metric = registry[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError('{} is already a {}'.format(name, metric.kind))
+        return metric
+
+
+def counter(name, help, labelnames=()):
+    """Get the counter called `name`, making it if need be"""
+    return _register(Counter, name, help, labelnames)
+
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Get the histogram called `name`, making it if need be"""
+    return _register(Histogram, name, help, labelnames, buckets)
+
+
+def reset():
+    """Forget the values of every metric"""
+    for metric in list(registry.values()):
+        metric.reset()
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value))
+                          for (name, value) in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metric(metric):
+    """One metric in the Prometheus text format"""
+    lines = ['# HELP {} {}'.format(metric.name, metric.help),
+             '# TYPE {} {}'.format(metric.name, metric.kind)]
+    for (label_values, value) in metric.values():
+        if metric.kind == 'counter':
+            lines.append('{}{} {}'.format(
+                metric.name, _labels(metric.labelnames, label_values),
+                _number(value.value)))
+            continue
+        cumulative = 0
+        for (bound, count) in zip(metric.buckets + (float('inf'),),
+                                  value.counts):
+            cumulative += count
+            lines.append('{}_bucket{} {}'.format(
+                metric.name,
+                _labels(metric.labelnames, label_values,
+                        [('le', _number(bound))]),
+                cumulative))
+        labels = _labels(metric.labelnames, label_values)
+        lines.append('{}_sum{} {}'.format(metric.name, labels,
+                                          _number(value.sum)))
+        lines.append('{}_count{} {}'.format(metric.name, labels,
+                                            value.count))
+    return '\n'.join(lines) + '\n'
+
+
+def render():
+    """Every metric in the Prometheus text format"""
+    return ''.join(render_metric(metric)
+                   for metric in list(registry.values()))
+
+
+def summary():
+    """A table of every metric with values, one line each.
+
+    Counters show their count; histograms the number of observations,
+    their total and their mean."""
+    rows = []
+    for metric in list(registry.values()):
+        for (label_values, value) in metric.values():
+            name = metric.name + _labels(metric.labelnames, label_values)
+            if metric.kind == 'counter':
+                rows.append((name, str(value.value), '', ''))
+            elif value.count:
+                rows.append((name, str(value.count),
+                             '{:.6f}'.format(value.sum),
+                             '{:.6f}'.format(value.sum / value.count)))
+    if not rows:
+        return ''
+    width = max(len(row[0]) for row in rows + [('metric',)])
+    lines = ['{:<{}} {:>8} {:>12} {:>12}'.format(
+        'metric', width, 'count', 'total', 'mean')]
+    lines.extend('{:<{}} {:>8} {:>12} {:>12}'.format(
+        name, width, count, total, mean)
+        for (name, count, total, mean) in rows)
+    return '\n'.join(lines) + '\n'
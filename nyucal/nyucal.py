@@ -7,105 +7,548 @@
 
 """
 from __future__ import print_function
+from collections import OrderedDict
+from collections.abc import Mapping
 import csv
-from datetime import datetime
-import inspect
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+import hashlib
 import io
 import logging
-
-import ics
-from lxml import html
-import requests
-from requests.exceptions import InvalidSchema
+import os
+import re
+import sys
+import threading
+from time import perf_counter
+import uuid
+
+from nyucal import metrics
+from nyucal.backends import get_backend
+from nyucal.index import EventIndex
+
+# lxml and requests are slow to import, so they are imported only where
+# they are needed; listing calendars from a file never loads requests,
+# and `nyucal --help` loads neither.
+
+log = logging.getLogger(__name__)
+
+_fetch_seconds = metrics.histogram(
+    'nyucal_fetch_seconds', 'Time spent downloading sources')
+_parse_document_seconds = metrics.histogram(
+    'nyucal_parse_document_seconds', 'Time spent parsing HTML documents')
+_parse_table_seconds = metrics.histogram(
+    'nyucal_parse_table_seconds', 'Time spent parsing calendar tables')
+_parse_row_seconds = metrics.histogram(
+    'nyucal_parse_row_seconds', 'Time spent parsing calendar table rows',
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001))
+_parsed_cache_lookups = metrics.counter(
+    'nyucal_parsed_cache_lookups_total',
+    'Lookups in the parsed-calendar cache', ['result'])
+_write_seconds = metrics.histogram(
+    'nyucal_write_seconds', 'Time spent writing calendars', ['writer'])
+
+PARSER_VERSION = 1
+"""Version of the parsing logic.  Bump it whenever a change to the
+parser would parse the same page differently, so that calendars cached
+by :code:`nyucal.cache.ParsedCache` are parsed again."""
 
 SOURCE_URL = "https://www.nyu.edu/registrar/calendars/university-academic-calendar.html?display=2"  # noqa
 
+_URL_RE = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*://\S+$')
+
+_MONTHS = {name: number for (number, name) in enumerate(
+    ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+     'august', 'september', 'october', 'november', 'december'], 1)}
+
+_WEEKDAYS = {name: number for (number, name) in enumerate(
+    ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday',
+     'sunday'])}
+
+_DATE_RE = re.compile(
+    r'\s*([A-Za-z]+),\s+([A-Za-z]+)\s+(\d{1,2}),\s+(\d{4})\s*$')
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    """Parse a date the way the registrar writes them.
+
+    Equivalent to :code:`datetime.strptime(text, '%A, %B %d, %Y').date()`
+    for English month and weekday names, but several times faster, and
+    the weekday is checked against the date.
+
+        >>> parse_date('Friday, March 11, 2016')
+        datetime.date(2016, 3, 11)
+        >>> parse_date('Monday, March 11, 2016')
+        Traceback (most recent call last):
+        ...
+        ValueError: 'Monday, March 11, 2016': March 11, 2016 is a Friday
+
+    Results are cached by `text`, since the same dates turn up many
+    times on a page.
+    """
+    match = _DATE_RE.match(text)
+    if match is None:
+        raise ValueError('{!r} does not match format '
+                         '"Weekday, Month D, YYYY"'.format(text))
+    (weekday, month, day, year) = match.groups()
+    try:
+        month = _MONTHS[month.lower()]
+        weekday = _WEEKDAYS[weekday.lower()]
+    except KeyError as e:
+        raise ValueError('{!r}: unknown name {}'.format(text, e))
+    result = date(int(year), month, int(day))
+    if result.weekday() != weekday:
+        raise ValueError('{!r}: {:%B} {}, {} is a {:%A}'.format(
+            text, result, result.day, result.year, result))
+    return result
+
 
 class CalendarStore(object):
     """Repository of academic calendars"""
 
     _tree = None
-    """internal element tree.  An |lxml.etree.Element|_ tree.
+    """internal document tree.  With the default backend, an
+    |lxml.etree.Element|_ tree.
 
     .. |lxml.etree.Element| replace:: :code:`lxml.etree.Element`
     .. _lxml.etree.Element: http://lxml.de/tutorial.html
     """
 
-    def __init__(self, source=None):
-        """Initializer"""
-        if source is not None:
+    backend = None
+    """The parser backend.  See :code:`nyucal.backends`."""
+
+    source = None
+    """The source the store was made from, as given.  Merged stores
+    record it on each event as its provenance."""
+
+    digest = None
+    """SHA-256 hex digest of the source, if it was fetched from a URL or
+    read through a parsed-calendar cache."""
+
+    _table_index = None
+    """internal map of calendar names to their tables"""
+
+    _calendars = None
+
+    _from_records = False
+    """whether `_table_index` maps names to cached event records, rather
+    than to tables"""
+
+    _merged = False
+    """whether `_table_index` maps names to the stores being merged that
+    have a calendar by that name, rather than to tables"""
+
+    quiet = False
+    """If true, never log per-row debug messages, even when debug logging
+    is enabled.  When it is not enabled they are skipped anyway."""
+
+    _parsed_trees = OrderedDict()
+    """Recently parsed trees of fetched sources, keyed by backend name
+    and digest."""
+
+    _parsed_trees_size = 4
+
+    _parsed_trees_lock = threading.Lock()
+
+    def __init__(self, source=None, http_cache=None, quiet=False,
+                 backend=None, session=None, parsed_cache=None):
+        """Initializer
+
+        If `http_cache` (an :code:`nyucal.cache.HttpCache`) is given,
+        URL sources are fetched through it, so unchanged pages are
+        revalidated instead of downloaded again.
+
+        `backend` is the name of the HTML parser backend to use (see
+        :code:`nyucal.backends`), default `lxml`.
+
+        URLs are fetched with `session`, a :code:`requests.Session`
+        (default: the shared one from
+        :code:`nyucal.sessions.default_session`).
+
+        If `parsed_cache` (an :code:`nyucal.cache.ParsedCache`) is given,
+        and it has calendars for a source with the same content, they
+        are loaded from it without parsing any HTML.  Otherwise every
+        calendar is parsed and saved in it.
+
+        `source` may also be a list of sources, which are each loaded as
+        above and merged as by :code:`merge`.
+        """
+        self.quiet = quiet
+        self.backend = get_backend(backend)
+        self.source = source
+        if isinstance(source, (list, tuple)):
+            self._merge([type(self)(each, http_cache=http_cache, quiet=quiet,
+                                    backend=self.backend, session=session,
+                                    parsed_cache=parsed_cache)
+                         for each in source])
+        elif source is not None and parsed_cache is not None:
+            self._load_through(parsed_cache, source, http_cache, session)
+        elif source is not None:
             try:
-                self._tree = html.parse(source)
+                with _parse_document_seconds.time():
+                    self._tree = self.backend.parse(source)
             except OSError:
-                try:
+                if _URL_RE.match(source):
                     # Maybe it's a URL.  Replace with the contents of that URL
-                    source = requests.get(source).text
-                except InvalidSchema:
-                    # Or maybe it's not.  Must be just a blob of HTML.
-                    pass
-                self._tree = html.parse(io.StringIO(source))
+                    (source, self.digest) = self._fetch(source, http_cache,
+                                                        session)
+                # Otherwise it must be just a blob of HTML.
+                self._tree = self._parse_string(source, self.digest,
+                                                self.backend)
+
+    def _load_through(self, parsed_cache, source, http_cache, session):
+        """Load calendars from `parsed_cache`, or parse them into it"""
+        if hasattr(source, 'read'):
+            content = source.read()
+        elif os.path.exists(source):
+            with open(source, 'rb') as source_file:
+                content = source_file.read()
+        elif _URL_RE.match(source):
+            (content, self.digest) = self._fetch(source, http_cache, session)
+        else:
+            content = source
+        self._load_content(parsed_cache, content)
+
+    def _load_content(self, parsed_cache, content):
+        """Load calendars from `parsed_cache`, or parse `content` (the
+        source's HTML, as text or bytes) into it"""
+        if self.digest is None:
+            data = content if isinstance(content, bytes) \
+                else content.encode('utf-8')
+            self.digest = hashlib.sha256(data).hexdigest()
+        records = parsed_cache.get(self.digest)
+        if records is not None:
+            _parsed_cache_lookups.labels('hit').inc()
+            self._table_index = OrderedDict(records)
+            self._from_records = True
+            return
+        _parsed_cache_lookups.labels('miss').inc()
+        if isinstance(content, bytes):
+            with _parse_document_seconds.time():
+                self._tree = self.backend.parse(io.BytesIO(content))
+        else:
+            self._tree = self._parse_string(content, self.digest,
+                                            self.backend)
+        parsed_cache.put(self.digest, self.calendars.values())
+
+    @staticmethod
+    def _fetch(url, http_cache=None, session=None):
+        """Download `url`, returning its text and the text's digest.
+
+        If `requests` can't fetch it (say, an `ftp:` URL), the URL itself
+        is returned, with no digest, to be parsed as HTML as before.  An
+        error status, once any retries are used up, raises
+        :code:`requests.HTTPError`.
+        """
+        from requests.exceptions import InvalidSchema
+        try:
+            with _fetch_seconds.time():
+                if http_cache is not None:
+                    (text, digest, _) = http_cache.fetch(url)
+                    return (text, digest)
+                if session is None:
+                    from nyucal.sessions import default_session
+                    session = default_session()
+                response = session.get(url)
+                response.raise_for_status()
+                text = response.text
+        except InvalidSchema:
+            return (url, None)
+        return (text, hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+    @classmethod
+    async def afetch(cls, urls, limit=4, executor=None, http_cache=None,
+                     session=None, **kwargs):
+        """Fetch and parse several sources concurrently.
+
+        A coroutine, returning a list of stores in the same order as
+        `urls`.  At most `limit` downloads run at once.  Downloads and
+        parsing both run in `executor` (default: the event loop's
+        default executor), so the event loop is never blocked; parsing
+        a page doesn't count against the download limit.  If
+        `parsed_cache` is given, pages are loaded through it as by the
+        initializer.  Other keyword arguments are passed on to the
+        initializer.
+
+            stores = asyncio.run(CalendarStore.afetch(urls))
+        """
+        import asyncio
+        from functools import partial
+        loop = asyncio.get_running_loop()
+        downloads = asyncio.Semaphore(limit)
+
+        async def fetch_and_parse(url):
+            async with downloads:
+                (text, digest) = await loop.run_in_executor(
+                    executor, partial(cls._fetch, url, http_cache, session))
+            store = await loop.run_in_executor(
+                executor, partial(cls._from_string, text, digest, **kwargs))
+            store.source = url
+            return store
+
+        return await asyncio.gather(*[fetch_and_parse(url) for url in urls])
+
+    @classmethod
+    def merge(cls, stores, **kwargs):
+        """Merge several stores into one.
+
+        Calendars with the same name are merged by
+        :code:`merge_calendars`, so an event found in several stores
+        appears once, with the `source` of each store that has it in
+        its `sources`.  Calendars are listed in the order they first
+        appear in `stores`, and each is merged the first time it is
+        looked up.  Other keyword arguments are passed on to the
+        initializer.
+
+            stores = asyncio.run(CalendarStore.afetch(urls))
+            store = CalendarStore.merge(stores)
+        """
+        store = cls(**kwargs)
+        store.source = [each.source for each in stores]
+        store._merge(stores)
+        return store
+
+    def _merge(self, stores):
+        """Index the calendars of `stores` by name, to be merged later"""
+        index = OrderedDict()
+        for store in stores:
+            for name in store.calendar_names:
+                index.setdefault(name, []).append(store)
+        self._table_index = index
+        self._merged = True
+
+    @classmethod
+    def _from_string(cls, text, digest=None, parsed_cache=None, **kwargs):
+        """Make a store from a string of already fetched HTML, through
+        `parsed_cache` if it is given"""
+        store = cls(**kwargs)
+        store.digest = digest
+        if parsed_cache is not None:
+            store._load_content(parsed_cache, text)
+        else:
+            store._tree = cls._parse_string(text, digest, store.backend)
+        return store
+
+    @classmethod
+    def _parse_string(cls, source, digest=None, backend=None):
+        """Parse an HTML string, reusing the tree of an identical
+        source parsed recently."""
+        backend = get_backend(backend)
+        if digest is None:
+            with _parse_document_seconds.time():
+                return backend.parse_string(source)
+        key = (backend.name, digest)
+        with cls._parsed_trees_lock:
+            tree = cls._parsed_trees.get(key)
+            if tree is not None:
+                cls._parsed_trees.move_to_end(key)
+                return tree
+        with _parse_document_seconds.time():
+            tree = backend.parse_string(source)
+        with cls._parsed_trees_lock:
+            cls._parsed_trees[key] = tree
+            while len(cls._parsed_trees) > cls._parsed_trees_size:
+                cls._parsed_trees.popitem(last=False)
+        return tree
+
+    @classmethod
+    def stream(cls, source, chunk_size=64 * 1024, session=None):
+        """Parse calendars incrementally, yielding each as it completes.
+
+        `source` may be a URL, a file path, a file object, or a string of
+        HTML, as for the initializer.  It is fed to the parser
+        `chunk_size` characters (or bytes) at a time, and each calendar
+        is yielded as soon as the end of its table has been parsed, so
+        the first calendar is available before the whole page has been
+        downloaded.  Tables are discarded once they have been parsed,
+        which keeps memory use flat however long the page is.
+
+        URLs are fetched with `session` (default: the shared session).
+        Streaming always uses the `lxml` backend.
+        """
+        from lxml import etree, html
+        store = cls(backend='lxml')
+        chunks, encoding = cls._iter_chunks(source, chunk_size, session)
+        parser = etree.HTMLPullParser(events=('end',), tag='table',
+                                      encoding=encoding)
+        parser.set_element_class_lookup(html.HtmlElementClassLookup())
+        for chunk in chunks:
+            parser.feed(chunk)
+            for cal in store._read_tables(parser):
+                yield cal
+        parser.close()
+        for cal in store._read_tables(parser):
+            yield cal
+
+    def _read_tables(self, parser):
+        """Parse the calendar tables the pull parser has finished, then
+        throw them away"""
+        for _, table in parser.read_events():
+            title = table.find('thead/tr/td/div[@class="calTitle"]')
+            if title is not None:
+                yield self._parse_table(table, title.text.strip())
+            table.clear()
+            parent = table.getparent()
+            if parent is not None:
+                while table.getprevious() is not None:
+                    del parent[0]
+
+    @staticmethod
+    def _iter_chunks(source, chunk_size, session=None):
+        """Split a source into chunks for incremental parsing.
+
+        Returns an iterator of chunks and the encoding of byte chunks
+        (or `None` to let the parser work it out)."""
+        if hasattr(source, 'read'):
+            return (iter(lambda: source.read(chunk_size), source.read(0)),
+                    None)
+        if os.path.exists(source):
+            def read_file():
+                with open(source, 'rb') as f:
+                    for chunk in iter(lambda: f.read(chunk_size), b''):
+                        yield chunk
+            return (read_file(), None)
+        if not _URL_RE.match(source):
+            return ((source[i:i + chunk_size]
+                     for i in range(0, len(source), chunk_size)), None)
+        if session is None:
+            from nyucal.sessions import default_session
+            session = default_session()
+        response = session.get(source, stream=True)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+
+        def read_response():
+            with response:
+                for chunk in response.iter_content(chunk_size):
+                    yield chunk
+        return (read_response(), response.encoding)
+
+    @property
+    def _tables(self):
+        """Map of calendar names to their tables, in document order.
+
+        Built by a single scan of the tree on first access."""
+        if self._table_index is None:
+            index = OrderedDict()
+            for (name, table) in self.backend.tables(self._tree):
+                index[name] = table
+            self._table_index = index
+        return self._table_index
 
     @property
     def calendars(self):
-        """The list of available calendars"""
-        raise NotImplementedError
+        """The available calendars, as a mapping of names to calendars.
+
+        The mapping is lazy: each calendar is parsed the first time it is
+        looked up, and kept for later lookups.  Iterating over
+        :code:`calendars.values()` or :code:`calendars.items()` parses
+        the calendars one at a time, in document order.
+        """
+        if self._calendars is None:
+            self._calendars = CalendarMapping(self)
+        return self._calendars
 
     @property
     def calendar_names(self):
         """The list of available calendar names"""
-        result = [elt.text.strip()
-                  for elt in self._tree.xpath('//div[@class="calTitle"]')]
-        return result
+        return list(self._tables)
 
     def calendar(self, name):
-        """Get a calendar by name."""
-        log = logging.getLogger(inspect.currentframe().f_code.co_name)
+        """Get a calendar by name.
+
+        Raises :code:`KeyError` if there is no calendar by that name."""
+        if self._merged:
+            return merge_calendars(
+                name, [(_source_label(store.source), store.calendars[name])
+                       for store in self._tables[name]])
+        if self._from_records:
+            cal = Calendar()
+            cal.name = name
+            cal.add_events(Event(name=event_name, description=description,
+                                 start=start, end=end)
+                           for (start, end, event_name, description)
+                           in self._tables[name])
+            return cal
+        return self._parse_table(self._tables[name], name)
+
+    def between(self, start=None, end=None):
+        """Events on any day from `start` to `end` in every calendar.
+
+        Returns a list of `(calendar name, event)` pairs, calendar by
+        calendar.  See :code:`Calendar.between`."""
+        return [(name, event) for (name, calendar) in self.calendars.items()
+                for event in calendar.between(start, end)]
+
+    def search(self, text):
+        """Events with every word in `text` in every calendar.
+
+        Returns a list of `(calendar name, event)` pairs, calendar by
+        calendar.  See :code:`Calendar.search`."""
+        return [(name, event) for (name, calendar) in self.calendars.items()
+                for event in calendar.search(text)]
+
+    def _parse_table(self, table, name):
+        """Parse a calendar's table into a :code:`Calendar`"""
+        # decide once per table, so that rows pay nothing for logging
+        # or metrics unless someone is listening
+        debug = not self.quiet and log.isEnabledFor(logging.DEBUG)
+        timing = metrics.is_enabled()
+        if timing:
+            table_start = perf_counter()
         cal = Calendar()
-        try:
-            table = [
-                elt.xpath('ancestor::table')[0]
-                for elt in self._tree.xpath('//div[@class="calTitle"]')
-                if elt.text.strip() == name
-            ].pop()
-        except:
-            raise
-        log.debug('table: %s', table)
-        for row in table.findall('tbody/tr'):
-            log.debug('row: %s', row)
+        cal.name = name
+        events = []
+        if debug:
+            log.debug('table: %s', table)
+        for (date_cell, text_cell) in self.backend.rows(table):
+            if timing:
+                row_start = perf_counter()
+            if debug:
+                log.debug('row: %s, %s', date_cell, text_cell)
             (event_date, event_end_date)\
-                = self._parse_event_date_cell(row.find('td[1]'))
+                = self._parse_event_date_cell(date_cell, debug)
             (event_name, event_description)\
-                = self._parse_event_text_cell(row.find('td[2]'))
+                = self._parse_event_text_cell(text_cell, debug)
+            # descriptions (and many names) repeat across rows and
+            # calendars, so share one copy of each
             e = Event(start=event_date, end=event_end_date,
-                      name=event_name, description=event_description)
-            cal.add_event(e)
+                      name=sys.intern(event_name),
+                      description=sys.intern(event_description))
+            events.append(e)
+            if timing:
+                _parse_row_seconds.observe(perf_counter() - row_start)
+        cal.add_events(events)
+        if timing:
+            _parse_table_seconds.observe(perf_counter() - table_start)
         return cal
 
-    def _parse_event_date_cell(self, elt):
+    def _parse_event_date_cell(self, elt, debug=False):
         """parse an event's date cell for the event's date
         (and end date too, if it exists)"""
-        log = logging.getLogger(inspect.currentframe().f_code.co_name)
-        fmt = '%A, %B %d, %Y'
         formatted_date = elt.text.rstrip(' -\xa0')
-        log.debug('formatted_date: %s', formatted_date)
-        event_date = datetime.strptime(formatted_date,
-                                       fmt).date()
-        log.debug('event_date: %s', event_date)
+        event_date = parse_date(formatted_date)
+        if debug:
+            log.debug('formatted_date: %s', formatted_date)
+            log.debug('event_date: %s', event_date)
         # look for an end date, if it exists
         try:
             formatted_end_date = elt.find('br').tail
-            log.debug('formatted_end_date: %s', formatted_end_date)
-            event_end_date = datetime.strptime(formatted_end_date,
-                                               fmt).date()
-            log.debug('event_end_date: %s', event_end_date)
+            if debug:
+                log.debug('formatted_end_date: %s', formatted_end_date)
+            event_end_date = parse_date(formatted_end_date)
+            if debug:
+                log.debug('event_end_date: %s', event_end_date)
         except AttributeError:
             event_end_date = None
         return (event_date, event_end_date)
 
-    def _parse_event_text_cell(self, elt):
+    def _parse_event_text_cell(self, elt, debug=False):
         """Parse an event's text cell for the event's title
         (and description, if it exists)"""
-        log = logging.getLogger(inspect.currentframe().f_code.co_name)
         # look for the event's title.  It shows up in several ways:
         # - inside a <strong> tag:
         event_name = elt.findtext('strong')
@@ -127,60 +570,223 @@ class CalendarStore(object):
             event_name = event_desc
             event_desc = ""
         event_desc = event_desc.replace(event_name, "", 1).strip()
-        log.debug('event_name: %s', event_name)
-        log.debug('event_desc: %s', event_desc)
+        if debug:
+            log.debug('event_name: %s', event_name)
+            log.debug('event_desc: %s', event_desc)
         return (event_name, event_desc)
 
 
+class CalendarMapping(Mapping):
+    """Read-only mapping of calendar names to lazily parsed calendars.
+
+    See :code:`CalendarStore.calendars`.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._parsed = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._parsed[name]
+        except KeyError:
+            pass
+        calendar = self._store.calendar(name)
+        # if another thread got there first, keep its calendar
+        return self._parsed.setdefault(name, calendar)
+
+    def __iter__(self):
+        return iter(self._store._tables)
+
+    def __len__(self):
+        return len(self._store._tables)
+
+    def __contains__(self, name):
+        return name in self._store._tables
+
+    def __repr__(self):
+        return '<CalendarMapping {!r}>'.format(list(self))
+
+
+def event_sort_key(event):
+    """Key that puts events in a total order.
+
+    Events are ordered by start date, then end date, then name.  An
+    event without an end date comes before any event with one on the
+    same start date, and missing values never get compared with dates
+    or strings.
+    """
+    return (event.start is not None, event.start or date.min,
+            event.end is not None, event.end or date.min,
+            event.name or '')
+
+
 class Calendar(object):
     """A single academic calendar"""
     name = None
     _events = None
+    _sorted = True
+    _index = None
+
+    _sort_lock = threading.Lock()
+    """held while sorting, so that only one thread sorts a calendar"""
 
     def __init__(self):
         self._events = []
 
     @property
     def events(self):
-        """The list of available events in a calendar."""
-        self._events = sorted(
-                self._events,
-                key=lambda d: (d.start, d.end, d.name))
+        """The list of available events in a calendar, in order.
+
+        The list is only sorted again after events have been added.
+        Several threads may read a finished calendar at once: the
+        sorted list replaces the unsorted one whole, rather than being
+        sorted in place, so no thread ever sees it half sorted."""
+        if not self._sorted:
+            with self._sort_lock:
+                if not self._sorted:
+                    self._events = sorted(self._events, key=event_sort_key)
+                    self._sorted = True
         return self._events
 
     def add_event(self, event):
         """Add an event to the calendar."""
         self._events.append(event)
+        self._sorted = False
+        self._index = None
+
+    def add_events(self, events):
+        """Add several events to the calendar at once."""
+        self._events.extend(events)
+        self._sorted = False
+        self._index = None
+
+    def between(self, start=None, end=None):
+        """The events on any day from `start` to `end`, inclusive, in
+        order.  See :code:`nyucal.index.EventIndex.between`."""
+        return self._event_index().between(start, end)
+
+    def search(self, text):
+        """The events whose name or description has every word in
+        `text`, in order.  See :code:`nyucal.index.EventIndex.search`."""
+        return self._event_index().search(text)
+
+    def _event_index(self):
+        """The index of the events, built again after events are added"""
+        index = self._index
+        if index is None:
+            index = self._index = EventIndex(self.events)
+        return index
+
+
+def _source_label(source):
+    """How a source is named in an event's provenance"""
+    return getattr(source, 'name', source)
+
+
+def merge_calendars(name, sourced_calendars):
+    """Merge calendars into a single one called `name`.
+
+    `sourced_calendars` is an iterable of `(source, calendar)` pairs.
+    Events with the same name, start and end date are duplicates, and
+    are merged into one new event whose `sources` lists, in order, each
+    source it was found in.  It keeps the first non-empty description.
+    Duplicates are found through a dictionary keyed by `(name, start,
+    end)`, so merging takes time linear in the number of events.
+    """
+    index = {}
+    events = []
+    for (source, calendar) in sourced_calendars:
+        for event in _events_of(calendar):
+            key = (event.name, event.start, event.end)
+            merged = index.get(key)
+            if merged is None:
+                merged = index[key] = Event(
+                    name=event.name, description=event.description,
+                    start=event.start, end=event.end, sources=(source,))
+                events.append(merged)
+                continue
+            if source not in merged.sources:
+                merged.sources += (source,)
+            if not merged.description:
+                merged.description = event.description
+    cal = Calendar()
+    cal.name = name
+    cal.add_events(events)
+    return cal
 
 
 class Event(object):
-    """A single event on an academic calendar"""
+    """A single event on an academic calendar
 
-    name = None
-    """Name of the event.  Usually displayed as the event's title in the
-    calendar."""
+    Events use :code:`__slots__` rather than an instance dictionary,
+    which roughly halves the memory each one takes.
+    """
 
-    description = None
-    """Description of the event.  Usually only displayed on a focused
-    view of the event."""
+    __slots__ = {
+        'name': """Name of the event.  Usually displayed as the event's
+        title in the calendar.""",
+        'description': """Description of the event.  Usually only
+        displayed on a focused view of the event.""",
+        'start': """Start date of the event.  A |datetime.date|_ object
+
+        Note that all NYU Calendar events are full day events.
+
+        .. |datetime.date| replace:: :code:`datetime.date`
+        .. _datetime.date: https://docs.python.org/3.5/library/datetime.html#date-objects
+        """,  # noqa
+        'end': """End date of the event.  A |datetime.date|_ object""",
+        'sources': """Tuple of the sources the event was found in, if
+        it comes from a merged store (see :code:`merge_calendars`), or
+        `None`.""",
+    }
+
+    def __init__(self, name=None, description=None, start=None, end=None,
+                 sources=None):
+        self.start = start
+        self.end = end
+        self.name = name
+        self.description = description
+        self.sources = sources
 
-    start = None
-    """Start date of the event.  A |datetime.date|_ object
+    def __setstate__(self, state):
+        # events pickled before __slots__ carry their attributes in a
+        # dict; newer ones in a (None, slots) pair.  Neither may have
+        # sources.
+        self.sources = None
+        if isinstance(state, tuple):
+            state = state[1]
+        for (key, value) in state.items():
+            setattr(self, key, value)
 
-    Note that all NYU Calendar events are full day events.
 
-    .. |datetime.date| replace:: :code:`datetime.date`
-    .. _datetime.date: https://docs.python.org/3.5/library/datetime.html#date-objects
-    """  # noqa
+def _events_of(calendar):
+    """The events of a :code:`Calendar`, or an iterable of events"""
+    return getattr(calendar, 'events', calendar)
 
-    end = None
-    """End date of the event.  A |datetime.date|_ object"""
 
-    def __init__(self, name=None, description=None, start=None, end=None):
-        self.start = start
-        self.end = end
-        self.name = name
-        self.description = description
+def stream(writer_class, calendar, buffer_size=64 * 1024):
+    """Render a calendar with `writer_class`, yielding the text in chunks.
+
+    `calendar` may be a :code:`Calendar` or any iterable of events,
+    which is consumed lazily.  Output is collected until there are at
+    least `buffer_size` characters and then yielded, so no more than
+    about `buffer_size` characters (plus one event) are ever held.
+
+        >>> cal = Calendar()
+        >>> cal.add_event(Event(name='Labor Day', start=date(2017, 9, 4)))
+        >>> ''.join(stream(GcalCsvWriter, cal)).splitlines()[1]
+        'Labor Day,09/04/2017,09/04/2017,True,'
+    """
+    buffer = io.StringIO()
+    writer = writer_class(buffer)
+    for _ in writer.iter_write(calendar):
+        if buffer.tell() >= buffer_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
 
 
 class GcalCsvWriter(csv.DictWriter):
@@ -199,9 +805,20 @@ class GcalCsvWriter(csv.DictWriter):
         super(GcalCsvWriter, self).__init__(file, fieldnames=self._field_names)
 
     def write(self, calendar):
-        """Write the calendar to the CSV file."""
+        """Write the calendar to the CSV file.
+
+        `calendar` may be a :code:`Calendar` or any iterable of events.
+        """
+        with _write_seconds.labels(type(self).__name__).time():
+            for _ in self.iter_write(calendar):
+                pass
+
+    def iter_write(self, calendar):
+        """Write the calendar to the CSV file one row at a time, yielding
+        after each row.  See :code:`stream`."""
         self.writeheader()
-        for event in calendar.events:
+        yield
+        for event in _events_of(calendar):
             event_dict = {
                 'Subject': event.name,
                 'Start Date': event.start.strftime(self._date_format),
@@ -213,23 +830,127 @@ class GcalCsvWriter(csv.DictWriter):
             else:
                 event_dict['End Date'] = event.end.strftime(self._date_format)
             self.writerow(event_dict)
-            
+            yield
 
-class IcsWriter():
-    """Write a calendar to an ICS file suitable for serving to calendar applications."""
 
-    def __init__(self,file):
+class IcsWriter(object):
+    """Write a calendar to an ICS file suitable for serving to calendar
+    applications.
+
+    The file is written directly, following `RFC 5545`_, one
+    :code:`VEVENT` at a time.  Every event is an all-day event.  Each
+    one gets a UID derived from its calendar's name, its dates and its
+    name, so it keeps the same UID every time the calendar is written.
+
+    .. _RFC 5545: https://tools.ietf.org/html/rfc5545
+    """
+
+    prodid = '-//NYU Math Clinic//nyucal//EN'
+
+    uid_domain = 'nyucal'
+
+    _uid_namespace = uuid.UUID('5f6b3e58-8a0d-4b39-9a4c-3d0f1a3c2b7e')
+
+    def __init__(self, file, stamp=None):
+        """Initializer
+
+        `stamp` is the :code:`datetime` written as every event's
+        :code:`DTSTAMP` (default: now).
+        """
         self.file = file
+        self.stamp = stamp
 
     def write(self, calendar):
-        """Write the calendar"""
-        c = ics.Calendar()
-        for event in calendar.events:
-            e = ics.Event()
-            e.name = event.name
-            e.begin = event.start
-            e.end = event.end
-            e.description = event.description
-            e.make_all_day()
-            c.events.add(e)
-        self.file.write(str(c))
+        """Write the calendar
+
+        `calendar` may be a :code:`Calendar` or any iterable of events.
+        """
+        with _write_seconds.labels(type(self).__name__).time():
+            for _ in self.iter_write(calendar):
+                pass
+
+    def iter_write(self, calendar):
+        """Write the calendar one event at a time, yielding after each
+        event.  See :code:`stream`."""
+        stamp = self.stamp or datetime.now(timezone.utc)
+        stamp = stamp.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        name = getattr(calendar, 'name', None)
+        write = self.file.write
+        write('BEGIN:VCALENDAR\r\n'
+              'VERSION:2.0\r\n'
+              'PRODID:' + self.prodid + '\r\n')
+        if name:
+            write(self._fold('X-WR-CALNAME:' + self._escape(name)))
+        yield
+        for (uid, event) in event_uids(calendar, name):
+            lines = ['BEGIN:VEVENT\r\n',
+                     'UID:' + uid + '@' + self.uid_domain + '\r\n',
+                     'DTSTAMP:' + stamp + '\r\n',
+                     'DTSTART;VALUE=DATE:{:%Y%m%d}\r\n'.format(event.start)]
+            if event.end is not None:
+                # DTEND is exclusive
+                lines.append('DTEND;VALUE=DATE:{:%Y%m%d}\r\n'.format(
+                    event.end + timedelta(days=1)))
+            lines.append(self._fold('SUMMARY:' + self._escape(event.name)))
+            if event.description:
+                lines.append(self._fold(
+                    'DESCRIPTION:' + self._escape(event.description)))
+            lines.append('END:VEVENT\r\n')
+            write(''.join(lines))
+            yield
+        write('END:VCALENDAR\r\n')
+        yield
+
+    @classmethod
+    def _uid(cls, calendar_name, event):
+        key = '\x1f'.join([calendar_name or '', str(event.start),
+                           str(event.end), event.name or ''])
+        return str(uuid.uuid5(cls._uid_namespace, key))
+
+    @staticmethod
+    def _escape(text):
+        """Escape a TEXT property value"""
+        return (text.replace('\\', '\\\\').replace(';', '\\;')
+                .replace(',', '\\,').replace('\r\n', '\\n')
+                .replace('\n', '\\n'))
+
+    @staticmethod
+    def _fold(line, limit=75):
+        """Fold a content line into lines of at most `limit` octets,
+        without splitting a UTF-8 character, and terminate it"""
+        if len(line) <= limit // 4 or len(line.encode('utf-8')) <= limit:
+            return line + '\r\n'
+        parts = []
+        size = 0
+        start = 0
+        for (i, char) in enumerate(line):
+            width = len(char.encode('utf-8'))
+            if size + width > limit:
+                parts.append(line[start:i])
+                start = i
+                # continuation lines begin with a space
+                size = 1
+            size += width
+        parts.append(line[start:])
+        return '\r\n '.join(parts) + '\r\n'
+
+
+def event_uids(calendar, name=None):
+    """Generate `(uid, event)` pairs for the events of a calendar.
+
+    `calendar` may be a :code:`Calendar` or any iterable of events;
+    `name` defaults to the calendar's name.  The UIDs are the ones
+    :code:`IcsWriter` writes, so an event keeps its UID as long as its
+    calendar's name, its dates and its name stay the same.  Identical
+    events get distinct UIDs, by their order in the calendar.
+    """
+    if name is None:
+        name = getattr(calendar, 'name', None)
+    seen = {}
+    for event in _events_of(calendar):
+        uid = IcsWriter._uid(name, event)
+        seen[uid] = seen.get(uid, 0) + 1
+        if seen[uid] > 1:
+            # identical events still need distinct UIDs
+            uid = '{}-{}'.format(uid, seen[uid])
+        yield (uid, event)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""HTTP sessions for fetching calendar sources.
+
+.. default-role:: code
+
+Fetching through one shared :code:`requests.Session` keeps connections
+to the registrar alive between fetches, instead of opening a new TCP
+and TLS connection for each one.  Sessions made here also retry failed
+requests with exponential backoff and never wait forever for a
+response.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (5, 30)
+"""Default `(connect, read)` timeout in seconds"""
+
+
+class TimeoutSession(requests.Session):
+    """A session with a default timeout for every request"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super(TimeoutSession, self).__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super(TimeoutSession, self).request(method, url, **kwargs)
+
+
+def make_session(timeout=DEFAULT_TIMEOUT, retries=3, backoff_factor=0.5,
+                 pool_connections=4, pool_maxsize=16):
+    """Make a pooled session that retries GETs.
+
+    Failed connections, and responses with status 429, 500, 502, 503 or
+    504, are retried up to `retries` times, sleeping
+    `backoff_factor * 2 ** (n - 1)` seconds before the `n`-th retry.
+    `pool_connections` hosts are kept in the pool, with up to
+    `pool_maxsize` open connections each, so that many threads can fetch
+    at once.
+    """
+    session = TimeoutSession(timeout)
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET', 'HEAD']),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def default_session():
+    """The process-wide session, made by :code:`make_session` on first use"""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = make_session()
+        return _default_session
@@ -1,7 +1,19 @@
 # -*- coding: utf-8 -*-
 
+from collections import Counter
 from functools import wraps
+import io
 import logging
+import os
+import sys
+import threading
+import time
+
+from nyucal import metrics
+
+_function_seconds = metrics.histogram(
+    'nyucal_function_seconds', 'Time spent in functions decorated with timed',
+    ['function'])
 
 
 def log_begin(func):
@@ -77,3 +89,206 @@ def log_result(func):
         logging.getLogger(func.__name__).info("result: %s", repr(res))
         return res
     return wrapper
+
+
+def _qualified_name(func):
+    return '{}.{}'.format(func.__module__,
+                          getattr(func, '__qualname__', func.__name__))
+
+
+def timed(func):
+    """Log how long each call of function :code:`func` takes
+
+    The time is also recorded in the `nyucal_function_seconds` metric,
+    labelled with the function's qualified name, while metrics are
+    enabled (see :code:`nyucal.metrics`).
+
+        >>> @timed
+        ... def h(x):
+        ...     return x-1
+        ...
+        >>> logging.basicConfig(level=logging.INFO)
+        >>> h(3)  # doctest: +ELLIPSIS
+        INFO:h:time: 0.0...s
+        2
+    """
+    histogram = _function_seconds.labels(_qualified_name(func))
+
+    @wraps(func)
+    def wrapper(*args, **kwds):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwds)
+        finally:
+            elapsed = time.perf_counter() - start
+            histogram.observe(elapsed)
+            logging.getLogger(func.__name__).info("time: %.6fs", elapsed)
+    return wrapper
+
+
+profiles = {}
+"""Accumulated :code:`pstats.Stats` of the functions decorated with
+:code:`profiled`, by qualified name"""
+
+_profiles_lock = threading.Lock()
+_profiling = threading.local()
+
+
+def profiled(func):
+    """Profile every call of function :code:`func` with cProfile
+
+    The statistics of all calls are added up in :code:`profiles`; see
+    :code:`profile_report`.  Calls made while a profiler is already
+    running in the same thread (say, for a recursive call, or under
+    `nyucal --profile=cprofile`) are not profiled again, so that the
+    running profiler keeps recording them.
+
+        >>> @profiled
+        ... def f(x):
+        ...     return sorted(range(x))
+        ...
+        >>> len(f(10)) + len(f(20))
+        30
+        >>> profiles['nyucal.utils.f'].total_calls > 0
+        True
+    """
+    import cProfile
+    name = _qualified_name(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwds):
+        # before Python 3.12, enabling a profiler silently takes over
+        # from any other running in the thread, so look for one first
+        if getattr(_profiling, 'active', False) or sys.getprofile():
+            return func(*args, **kwds)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is running
+            return func(*args, **kwds)
+        _profiling.active = True
+        try:
+            return func(*args, **kwds)
+        finally:
+            profile.disable()
+            _profiling.active = False
+            _add_profile(name, profile)
+    return wrapper
+
+
+def _add_profile(name, profile):
+    import pstats
+    with _profiles_lock:
+        if name in profiles:
+            profiles[name].add(profile)
+        else:
+            profiles[name] = pstats.Stats(profile)
+
+
+def profile_report(stats, limit=25, sort='cumulative'):
+    """The `limit` hottest functions in some :code:`pstats.Stats` (or
+    a :code:`cProfile.Profile`), sorted by `sort`, as a string"""
+    import pstats
+    output = io.StringIO()
+    if not isinstance(stats, pstats.Stats):
+        stats = pstats.Stats(stats)
+    stats.stream = output
+    stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return '{}:{}'.format(os.path.basename(code.co_filename),
+                          getattr(code, 'co_qualname', code.co_name))
+
+
+class SamplingProfiler(object):
+    """Sample a thread's call stack at regular intervals
+
+    A background thread looks at the stack of the profiled thread every
+    `interval` seconds and counts how often each stack was seen.  Unlike
+    cProfile, this costs the profiled thread almost nothing, and the
+    result can be written as collapsed stacks, one line per stack, root
+    first, as read by flame graph tools:
+
+        cli.py:main;nyucal.py:CalendarStore.__init__;... 12
+
+    Use it as a context manager, or call :code:`start` and :code:`stop`.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None, all_threads=False):
+        """Initializer
+
+        Profiles the thread with id `thread_id` (default: the thread
+        that calls :code:`start`), or every other thread if
+        `all_threads` is true."""
+        self.interval = interval
+        self.thread_id = thread_id
+        self.all_threads = all_threads
+        self.stacks = Counter()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='nyucal-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Record the profiled threads' current stacks"""
+        frames = sys._current_frames()
+        if self.all_threads:
+            me = threading.get_ident()
+            frames = [frame for (ident, frame) in frames.items()
+                      if ident != me]
+        else:
+            frames = [frames.get(self.thread_id)]
+        for frame in frames:
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self):
+        """The stacks seen, in the collapsed format, most common first"""
+        return ''.join('{} {}\n'.format(stack, count)
+                       for (stack, count) in self.stacks.most_common())
+
+    def report(self, limit=25):
+        """The `limit` functions seen most often at the top of the
+        stack, with the share of samples they were seen in"""
+        total = sum(self.stacks.values())
+        if not total:
+            return 'no samples\n'
+        leaves = Counter()
+        for (stack, count) in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        lines = ['{} samples every {}s'.format(total, self.interval)]
+        lines.extend('{:6.1%}  {}'.format(count / total, name)
+                     for (name, count) in leaves.most_common(limit))
+        return '\n'.join(lines) + '\n'
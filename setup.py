@@ -16,9 +16,13 @@ requirements = [
     'Flask>=1.1.2',
     'lxml',
     'requests>=2.18.1',
-    'ics>=0.7'
 ]
 
+extras_requirements = {
+    'selectolax': ['selectolax>=0.3'],
+    'brotli': ['brotli'],
+}
+
 setup_requirements = [
     'pytest-runner',
     # TODO(leingang): put setup requirements (distutils extensions, etc.) here
@@ -26,7 +30,7 @@ setup_requirements = [
 
 test_requirements = [
     'pytest',
-    # TODO: put package test requirements here
+    'ics>=0.7',
 ]
 
 setup(
@@ -45,6 +49,7 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     zip_safe=False,
     keywords='nyucal',
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""Shared fixtures for `nyucal` tests."""
+
+import os.path
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from click.testing import CliRunner
+import py.path
+import pytest
+
+from nyucal import backends, metrics, nyucal
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                          'golden')
+
+GOLDEN_HTML = os.path.join(
+    GOLDEN_DIR,
+    'New York University - University Registrar - Calendars - Academic Calendar.html')  # noqa
+
+
+@pytest.fixture
+def goldendir(request):
+    """Directory where golden files reside (a py.path.local object)
+    """
+    return py.path.local(GOLDEN_DIR)
+
+
+@pytest.fixture
+def html_path(request):
+    """NYU Academic Calendar HTML file path"""
+    return py.path.local(GOLDEN_HTML)
+
+
+@pytest.fixture(params=sorted(backends.backends))
+def backend(request):
+    """Each parser backend, skipping those that aren't installed"""
+    if request.param not in backends.available_backends():
+        pytest.skip('{} backend is not installed'.format(request.param))
+    return request.param
+
+
+@pytest.fixture
+def calendar_store(request, html_path, backend):
+    """A store of the golden page, with each parser backend"""
+    return nyucal.CalendarStore(str(html_path), backend=backend)
+
+
+class CalendarServer(object):
+    """A local stand-in for the registrar's web server.
+
+    Serves `body` at every path, with an `ETag` and `Last-Modified`
+    header, and answers conditional requests with `304 Not Modified`.
+    The next `failures` requests get `503 Service Unavailable`, with
+    `failure_body` as their body, and every response is held back for
+    `delay` seconds.
+    Counts what it has been asked for, and on how many connections, so
+    tests can check it."""
+
+    last_modified = 'Tue, 20 Jun 2017 00:00:00 GMT'
+
+    def __init__(self, body):
+        self.body = body
+        self.requests = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.failure_body = ''
+        self.delay = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = set()
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight,
+                                               server.in_flight)
+                try:
+                    time.sleep(server.delay)
+                    self._get()
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _get(self):
+                with server._lock:
+                    server.requests += 1
+                    server.connections.add(self.client_address)
+                    fail = server.failures > 0
+                    if fail:
+                        server.failures -= 1
+                if fail:
+                    data = server.failure_body.encode('utf-8')
+                    self.send_response(503)
+                    self.send_header('Content-Type',
+                                     'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                etag = server.etag
+                if (self.headers.get('If-None-Match') == etag or
+                        self.headers.get('If-Modified-Since') ==
+                        server.last_modified):
+                    with server._lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                data = server.body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', server.last_modified)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}/calendar.html'.format(
+            self._httpd.server_address[1])
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+
+    @property
+    def etag(self):
+        return '"{:x}"'.format(hash(self.body) & 0xffffffff)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def calendar_server(request):
+    """A local HTTP server serving the golden registrar page"""
+    with open(GOLDEN_HTML, encoding='utf-8') as golden_file:
+        server = CalendarServer(golden_file.read())
+    server.start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+@pytest.fixture
+def cli_runner(request):
+    """A command line runner for click applications"""
+    return CliRunner()
+
+
+@pytest.fixture
+def metrics_enabled(request):
+    """Record metrics, starting from zero, for the length of a test"""
+    metrics.reset()
+    metrics.enable()
+
+    def teardown():
+        metrics.disable()
+        metrics.reset()
+
+    request.addfinalizer(teardown)
+    return metrics
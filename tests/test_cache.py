@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `nyucal.cache` module."""
+
+from datetime import datetime, timezone
+import functools
+import hashlib
+import threading
+import time
+
+import pytest
+import requests
+
+from nyucal import nyucal
+from nyucal.cache import ArtifactCache, HttpCache, ParsedCache, \
+    StoreRefresher, StoreUnavailable
+from nyucal.sessions import make_session
+
+
+class FakeClock(object):
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeStore(object):
+    """Just enough of a store for a refresher"""
+
+    def __init__(self, n):
+        self.n = n
+        self.digest = str(n)
+        self.calendars = {}
+
+
+class StoreFactory(object):
+    """Builds numbered fake stores, or fails while `error` is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+
+    def __call__(self, source):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return FakeStore(self.calls)
+
+
+@pytest.fixture
+def clock(request):
+    return FakeClock()
+
+
+def test_http_cache_revalidates(calendar_server, tmpdir):
+    cache = HttpCache(str(tmpdir.join('http')))
+    first = cache.fetch(calendar_server.url)
+    assert first.fresh
+    second = cache.fetch(calendar_server.url)
+    assert not second.fresh
+    assert second.text == first.text
+    assert second.digest == first.digest
+    assert calendar_server.requests == 2
+    assert calendar_server.not_modified == 1
+
+
+def test_http_cache_refetches_changed_body(calendar_server, tmpdir):
+    cache = HttpCache(str(tmpdir.join('http')))
+    first = cache.fetch(calendar_server.url)
+    calendar_server.body = calendar_server.body.replace(
+        'Fall 2016', 'Fall 2016 (revised)')
+    calendar_server.last_modified = 'Wed, 21 Jun 2017 00:00:00 GMT'
+    second = cache.fetch(calendar_server.url)
+    assert second.fresh
+    assert second.digest != first.digest
+
+
+def test_http_cache_keeps_cached_copy_on_error(calendar_server, tmpdir):
+    cache = HttpCache(str(tmpdir.join('http')),
+                      session=make_session(retries=0))
+    calendar_server.failures = 1
+    calendar_server.failure_body = '<html>Service Unavailable</html>'
+    with pytest.raises(requests.HTTPError):
+        cache.fetch(calendar_server.url)
+    first = cache.fetch(calendar_server.url)
+    calendar_server.failures = 1
+    second = cache.fetch(calendar_server.url)
+    assert (second.text, second.digest, second.fresh) == \
+        (first.text, first.digest, False)
+
+
+def test_http_cache_keeps_line_endings(calendar_server, tmpdir):
+    cache = HttpCache(str(tmpdir.join('http')))
+    calendar_server.body = calendar_server.body.replace('\n', '\r\n')
+    first = cache.fetch(calendar_server.url)
+    second = cache.fetch(calendar_server.url)
+    assert not second.fresh
+    assert second.text == first.text == calendar_server.body
+    assert hashlib.sha256(second.text.encode('utf-8')).hexdigest() == \
+        second.digest
+
+
+def test_calendar_store_through_http_cache(calendar_server, tmpdir):
+    cache = HttpCache(str(tmpdir.join('http')))
+    first = nyucal.CalendarStore(calendar_server.url, http_cache=cache)
+    second = nyucal.CalendarStore(calendar_server.url, http_cache=cache)
+    assert first.digest == second.digest
+    # an unchanged body is not parsed a second time
+    assert first._tree is second._tree
+    assert 'Fall 2017' in second.calendar_names
+    assert calendar_server.not_modified == 1
+
+
+@pytest.fixture
+def parsed_cache(request, tmpdir):
+    return ParsedCache(str(tmpdir.join('parsed.sqlite3')))
+
+
+def test_parsed_cache_round_trip(parsed_cache, calendar_store):
+    calendars = list(calendar_store.calendars.values())
+    assert parsed_cache.get('abc') is None
+    parsed_cache.put('abc', calendars)
+    records = parsed_cache.get('abc')
+    assert [name for (name, _) in records] == \
+        [cal.name for cal in calendars]
+    assert records[4][1] == [(e.start, e.end, e.name, e.description)
+                             for e in calendars[4].events]
+
+
+def test_parsed_cache_invalidated_by_parser_version(tmpdir, calendar_store):
+    path = str(tmpdir.join('parsed.sqlite3'))
+    ParsedCache(path, parser_version=1).put(
+        'abc', calendar_store.calendars.values())
+    assert ParsedCache(path, parser_version=1).get('abc') is not None
+    assert ParsedCache(path, parser_version=2).get('abc') is None
+    # and the stale entry is gone for good
+    assert ParsedCache(path, parser_version=1).get('abc') is None
+
+
+def test_parsed_cache_keeps_recent_entries(tmpdir):
+    cache = ParsedCache(str(tmpdir.join('parsed.sqlite3')), max_entries=2)
+    for digest in ['a', 'b', 'c']:
+        cache.put(digest, [])
+        time.sleep(0.01)
+    assert cache.get('a') is None
+    assert cache.get('b') == []
+    assert cache.get('c') == []
+
+
+def test_calendar_store_warm_start(parsed_cache, html_path, monkeypatch):
+    cold = nyucal.CalendarStore(str(html_path), parsed_cache=parsed_cache)
+    expected = [(cal.name, [(e.start, e.end, e.name, e.description)
+                            for e in cal.events])
+                for cal in cold.calendars.values()]
+
+    def no_parsing(*args):
+        raise AssertionError('parsed HTML on a warm start')
+
+    monkeypatch.setattr(nyucal.CalendarStore, '_parse_table', no_parsing)
+    monkeypatch.setattr(nyucal.CalendarStore, '_parse_string', no_parsing)
+    warm = nyucal.CalendarStore(str(html_path), parsed_cache=parsed_cache)
+    assert warm.digest == cold.digest
+    assert warm._tree is None
+    assert [(cal.name, [(e.start, e.end, e.name, e.description)
+                        for e in cal.events])
+            for cal in warm.calendars.values()] == expected
+
+
+def test_artifact_cache_by_source_version(calendar_store):
+    cache = ArtifactCache(encodings=['gzip'])
+    first = cache.get(calendar_store, 'Fall 2017', nyucal.GcalCsvWriter)
+    assert cache.get(calendar_store, 'Fall 2017',
+                     nyucal.GcalCsvWriter) is first
+    assert first.body.startswith(b'Subject,')
+    assert set(first.encoded) == {'gzip'}
+    # another store of the same source is another version, unless the
+    # two know they have the same digest
+    other = nyucal.CalendarStore(calendar_store.source)
+    assert cache.get(other, 'Fall 2017', nyucal.GcalCsvWriter) is not first
+    calendar_store.digest = other.digest = 'abc'
+    renamed = cache.get(calendar_store, 'Fall 2017', nyucal.GcalCsvWriter)
+    assert cache.get(other, 'Fall 2017', nyucal.GcalCsvWriter) is renamed
+    assert (renamed.body, renamed.etag) == (first.body, first.etag)
+    with pytest.raises(KeyError):
+        cache.get(calendar_store, 'Fall 1999', nyucal.GcalCsvWriter)
+
+
+def test_artifact_cache_same_bytes_everywhere(calendar_store):
+    """Caches in different processes, or a cache after an eviction,
+    render exactly the same bytes, so their ETags agree"""
+    first = ArtifactCache(max_entries=1, encodings=['gzip'])
+    artifact = first.get(calendar_store, 'Fall 2017', nyucal.IcsWriter)
+    time.sleep(1.1)
+    # evicted, then rendered again
+    first.get(calendar_store, 'Fall 2016', nyucal.IcsWriter)
+    again = first.get(calendar_store, 'Fall 2017', nyucal.IcsWriter)
+    assert again is not artifact
+    assert again == artifact
+    other = ArtifactCache(encodings=['gzip'])
+    assert other.get(calendar_store, 'Fall 2017',
+                     nyucal.IcsWriter) == artifact
+    assert b'DTSTAMP:19700101T000000Z' in artifact.body
+    stamped = ArtifactCache(encodings=[], stamp=datetime(
+        2017, 6, 20, tzinfo=timezone.utc))
+    assert b'DTSTAMP:20170620T000000Z' in stamped.get(
+        calendar_store, 'Fall 2017', nyucal.IcsWriter).body
+
+
+def test_artifact_cache_keeps_recent_entries(calendar_store):
+    cache = ArtifactCache(max_entries=2, encodings=[])
+    names = calendar_store.calendar_names[:3]
+    artifacts = [cache.get(calendar_store, name, nyucal.IcsWriter)
+                 for name in names]
+    assert cache.get(calendar_store, names[2],
+                     nyucal.IcsWriter) is artifacts[2]
+    assert cache.get(calendar_store, names[0],
+                     nyucal.IcsWriter) is not artifacts[0]
+
+
+def test_store_refresher_swaps_snapshots(clock):
+    factory = StoreFactory()
+    refresher = StoreRefresher('src', factory=factory, clock=clock)
+    assert refresher.status()['status'] == 'starting'
+    with pytest.raises(StoreUnavailable):
+        refresher.get(timeout=0)
+    assert refresher.refresh()
+    first = refresher.get()
+    clock.now = 7
+    assert refresher.age == 7
+    assert refresher.refresh()
+    assert refresher.get().n == 2 and first.n == 1
+    status = refresher.status()
+    assert (status['status'], status['age'], status['digest'],
+            status['refreshes']) == ('ok', 0, '2', 2)
+
+
+def test_store_refresher_keeps_snapshot_on_failure(clock):
+    factory = StoreFactory()
+    refresher = StoreRefresher('src', factory=factory, clock=clock)
+    factory.error = IOError('registrar is down')
+    assert not refresher.refresh()
+    assert refresher.status()['status'] == 'error'
+    factory.error = None
+    refresher.refresh()
+    factory.error = IOError('registrar is down')
+    clock.now = 5
+    assert not refresher.refresh()
+    assert refresher.get().n == 2
+    status = refresher.status()
+    assert (status['status'], status['age'], status['failures']) == \
+        ('stale', 5, 2)
+    assert status['last_error'] == 'OSError: registrar is down'
+
+
+def test_store_refresher_stale_when_too_old(clock):
+    factory = StoreFactory()
+    refresher = StoreRefresher('src', interval=10, factory=factory,
+                               clock=clock)
+    assert refresher.status()['since_attempt'] is None
+    refresher.refresh()
+    clock.now = 30
+    status = refresher.status()
+    assert (status['status'], status['since_attempt']) == ('ok', 30)
+    # a refresh starts, and hangs
+    gate = threading.Event()
+    started = threading.Event()
+
+    def slow_factory(source):
+        started.set()
+        gate.wait(5)
+        return factory(source)
+
+    refresher.factory = slow_factory
+    thread = threading.Thread(target=refresher.refresh)
+    thread.start()
+    started.wait(5)
+    clock.now = 31
+    status = refresher.status()
+    assert (status['status'], status['age'], status['since_attempt'],
+            status['stale_after']) == ('stale', 31, 1, 30)
+    gate.set()
+    thread.join(5)
+    assert refresher.status()['status'] == 'ok'
+
+
+def test_store_refresher_keeps_snapshot_on_error_page(calendar_server):
+    factory = functools.partial(nyucal.CalendarStore,
+                                session=make_session(retries=0))
+    refresher = StoreRefresher(calendar_server.url, factory=factory)
+    assert refresher.refresh()
+    first = refresher.get()
+    calendar_server.failures = 1
+    calendar_server.failure_body = '<html>Service Unavailable</html>'
+    assert not refresher.refresh()
+    assert refresher.get() is first
+    status = refresher.status()
+    assert status['status'] == 'stale'
+    assert status['last_error'].startswith('HTTPError: 503')
+    # a page that is served fine, but has no calendars on it
+    calendar_server.body = calendar_server.failure_body
+    assert not refresher.refresh()
+    assert refresher.get() is first
+    assert refresher.status()['last_error'] == \
+        'ValueError: no calendars found in ' + calendar_server.url
+
+
+def test_store_refresher_runs_in_background():
+    factory = StoreFactory()
+    refresher = StoreRefresher('src', interval=0.01, factory=factory)
+    refresher.start()
+    try:
+        assert refresher.get(timeout=5).n >= 1
+        for _ in range(500):
+            if refresher.refreshes >= 3:
+                break
+            time.sleep(0.01)
+        assert refresher.refreshes >= 3
+    finally:
+        refresher.stop(5)
+    calls = factory.calls
+    time.sleep(0.05)
+    assert factory.calls == calls
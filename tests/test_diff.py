@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `nyucal.diff` module."""
+
+from datetime import date
+import json
+
+import pytest
+
+from nyucal import cli, nyucal
+from nyucal.diff import diff_calendars, diff_stores
+
+
+def make_calendar(name, events):
+    cal = nyucal.Calendar()
+    cal.name = name
+    cal.add_events(events)
+    return cal
+
+
+@pytest.fixture
+def revised_string(request, html_path):
+    """The golden page with Fall 2016 renamed and a holiday renamed"""
+    return (html_path.read_text('utf-8')
+            .replace('Fall 2016', 'Fall 2015')
+            .replace('Independence Day', 'Independence Day (observed)'))
+
+
+def test_diff_calendars():
+    labor_day = nyucal.Event(name='Labor Day', start=date(2017, 9, 4))
+    recess = nyucal.Event(name='Recess', start=date(2017, 11, 22),
+                          end=date(2017, 11, 24))
+    moved = nyucal.Event(name='Recess', start=date(2017, 11, 23),
+                         end=date(2017, 11, 24))
+    described = nyucal.Event(name='Labor Day', description='No classes',
+                             start=date(2017, 9, 4))
+    old = make_calendar('Fall 2017', [labor_day, recess])
+    new = make_calendar('Fall 2017', [described, moved])
+    diff = diff_calendars(old, new)
+    uids = dict(nyucal.event_uids(new))
+    assert diff.name == 'Fall 2017'
+    assert diff.added == [(uid, event) for (uid, event) in uids.items()
+                          if event is moved]
+    assert [event for (_, event) in diff.removed] == [recess]
+    assert diff.modified == [(next(iter(uids)), labor_day, described)]
+    assert diff_calendars(old, make_calendar('Fall 2017',
+                                             [labor_day, recess])) is None
+
+
+def test_diff_calendar_added_and_removed():
+    labor_day = nyucal.Event(name='Labor Day', start=date(2017, 9, 4))
+    cal = make_calendar('Fall 2017', [labor_day])
+    assert [e for (_, e) in diff_calendars(None, cal).added] == [labor_day]
+    assert [e for (_, e) in diff_calendars(cal, None).removed] == [labor_day]
+
+
+def test_diff_uses_ics_uids(calendar_store, revised_string):
+    """The identities are the ones in the ICS feeds"""
+    revised = nyucal.CalendarStore(revised_string)
+    for diff in diff_stores(calendar_store, revised):
+        for (uid, event) in diff.added:
+            assert uid == nyucal.IcsWriter._uid(diff.name, event)
+
+
+def test_diff_stores(calendar_store, revised_string):
+    diffs = diff_stores(calendar_store, nyucal.CalendarStore(revised_string))
+    by_name = {diff.name: diff for diff in diffs}
+    assert sorted(by_name) == ['Fall 2015', 'Fall 2016', 'Fall 2017',
+                               'Fall 2018', 'Summer 2017', 'Summer 2018']
+    assert diffs[-1].name == 'Fall 2016'
+    assert not by_name['Fall 2016'].added
+    assert len(by_name['Fall 2016'].removed) == \
+        len(calendar_store.calendars['Fall 2016'].events)
+    fall_2017 = by_name['Fall 2017']
+    assert [e.name for (_, e) in fall_2017.added] == \
+        ['Independence Day (observed)']
+    assert [e.name for (_, e) in fall_2017.removed] == ['Independence Day']
+    assert fall_2017.modified == []
+
+
+def test_diff_same_digest_parses_nothing(calendar_server, monkeypatch):
+    first = nyucal.CalendarStore(calendar_server.url)
+    second = nyucal.CalendarStore(calendar_server.url)
+
+    def no_parsing(*args):
+        raise AssertionError('parsed a calendar')
+
+    monkeypatch.setattr(nyucal.CalendarStore, '_parse_table', no_parsing)
+    assert diff_stores(first, second) == []
+
+
+def test_cli_diff(cli_runner, html_path, revised_string):
+    result = cli_runner.invoke(cli.main, ['diff', str(html_path),
+                                          revised_string])
+    assert result.exit_code == 1
+    lines = result.output.splitlines()
+    i = lines.index('Fall 2017')
+    assert lines[i + 1:i + 3] == [
+        '+ 2017-07-04  Independence Day (observed)',
+        '- 2017-07-04  Independence Day']
+    result = cli_runner.invoke(cli.main, ['diff', str(html_path),
+                                          str(html_path)])
+    assert (result.exit_code, result.output) == (0, '')
+
+
+def test_cli_diff_json(cli_runner, html_path, revised_string):
+    result = cli_runner.invoke(cli.main, ['diff', '--json', str(html_path),
+                                          revised_string])
+    assert result.exit_code == 1
+    changes = {d['calendar']: d for d in json.loads(result.output)}
+    assert changes['Fall 2017']['added'][0]['name'] == \
+        'Independence Day (observed)'
+    assert changes['Fall 2017']['added'][0]['start'] == '2017-07-04'
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `nyucal.index` module."""
+
+from datetime import date
+
+from nyucal import nyucal
+from nyucal.index import EventIndex, tokenize
+
+
+def scan_between(events, start, end):
+    """What `between` should find, by looking at every event"""
+    return [event for event in events if event.start is not None
+            and (end is None or event.start <= end)
+            and (start is None or (event.end or event.start) >= start)]
+
+
+def test_tokenize():
+    assert tokenize('Reading Day: no classes.') == \
+        ['reading', 'day', 'no', 'classes']
+    assert tokenize(None) == []
+
+
+def test_between_matches_scan(calendar_store):
+    ranges = [(date(2017, 11, 20), date(2017, 11, 24)),
+              (date(2017, 11, 26), date(2017, 11, 26)),
+              (None, date(2017, 1, 1)),
+              (date(2018, 5, 1), None),
+              (None, None),
+              (date(2030, 1, 1), date(2030, 12, 31))]
+    for calendar in calendar_store.calendars.values():
+        for (start, end) in ranges:
+            assert calendar.between(start, end) == \
+                scan_between(calendar.events, start, end)
+
+
+def test_between_finds_events_spanning_the_range():
+    cal = nyucal.Calendar()
+    recess = nyucal.Event(name='Recess', start=date(2017, 11, 22),
+                          end=date(2017, 11, 26))
+    cal.add_events([recess, nyucal.Event(name='Undated'),
+                    nyucal.Event(name='Later', start=date(2017, 12, 1))])
+    assert cal.between(date(2017, 11, 24), date(2017, 11, 25)) == [recess]
+    assert [e.name for e in cal.between()] == ['Recess', 'Later']
+
+
+def test_search(calendar_store):
+    found = calendar_store.search('reading DAY')
+    assert [(name, event.start) for (name, event) in found] == [
+        ('Spring 2017', date(2017, 5, 9)),
+        ('Spring 2018', date(2018, 5, 8)),
+    ]
+    assert calendar_store.search('read') == []
+    assert calendar_store.search('  ') == []
+
+
+def test_search_matches_scan(calendar_store):
+    for calendar in calendar_store.calendars.values():
+        for text in ['classes', 'last day', 'Thanksgiving recess']:
+            words = set(tokenize(text))
+            assert calendar.search(text) == [
+                event for event in calendar.events
+                if words <= set(tokenize(event.name)
+                                + tokenize(event.description))]
+
+
+def test_index_rebuilt_after_adding_events():
+    cal = nyucal.Calendar()
+    cal.add_event(nyucal.Event(name='Labor Day', start=date(2017, 9, 4)))
+    assert len(cal.search('labor day')) == 1
+    cal.add_event(nyucal.Event(name='Labor Day', start=date(2018, 9, 3)))
+    assert [e.start for e in cal.search('labor day')] == \
+        [date(2017, 9, 4), date(2018, 9, 3)]
+    assert [e.start for e in cal.between(date(2018, 1, 1))] == \
+        [date(2018, 9, 3)]
+
+
+def test_empty_index():
+    index = EventIndex([])
+    assert index.between(date(2017, 1, 1), date(2017, 12, 31)) == []
+    assert index.search('anything') == []
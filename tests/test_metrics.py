@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `nyucal.metrics` module."""
+
+import io
+
+import pytest
+
+from nyucal import cli, metrics, nyucal
+
+
+def test_disabled_metrics_record_nothing():
+    metrics.reset()
+    counter = metrics.counter('test_disabled_total', 'A counter')
+    histogram = metrics.histogram('test_disabled_seconds', 'A histogram')
+    counter.inc()
+    histogram.observe(1)
+    with histogram.time():
+        pass
+    assert counter.values() == []
+    assert histogram.values() == []
+
+
+def test_counter(metrics_enabled):
+    counter = metrics.counter('test_lookups_total', 'Lookups', ['result'])
+    assert metrics.counter('test_lookups_total', 'Lookups') is counter
+    counter.labels('hit').inc()
+    counter.labels('hit').inc(2)
+    counter.labels('miss').inc()
+    assert metrics.render_metric(counter) == (
+        '# HELP test_lookups_total Lookups\n'
+        '# TYPE test_lookups_total counter\n'
+        'test_lookups_total{result="hit"} 3\n'
+        'test_lookups_total{result="miss"} 1\n')
+    with pytest.raises(ValueError):
+        metrics.histogram('test_lookups_total', 'Not a histogram')
+
+
+def test_histogram(metrics_enabled):
+    histogram = metrics.histogram('test_sizes', 'Sizes', buckets=[1, 10])
+    for value in [0.5, 1, 5, 50]:
+        histogram.observe(value)
+    assert metrics.render_metric(histogram).splitlines()[2:] == [
+        'test_sizes_bucket{le="1"} 2',
+        'test_sizes_bucket{le="10"} 3',
+        'test_sizes_bucket{le="+Inf"} 4',
+        'test_sizes_sum 56.5',
+        'test_sizes_count 4',
+    ]
+
+
+def test_timer_skips_failures(metrics_enabled):
+    histogram = metrics.histogram('test_timed_seconds', 'Timings')
+    with histogram.time():
+        pass
+    with pytest.raises(KeyError):
+        with histogram.time():
+            raise KeyError('nope')
+    [(_, value)] = histogram.values()
+    assert value.count == 1
+    assert 0 <= value.sum < 1
+
+
+def test_stages_are_instrumented(metrics_enabled, html_path):
+    store = nyucal.CalendarStore(str(html_path))
+    calendar = store.calendars['Fall 2017']
+    nyucal.IcsWriter(io.StringIO()).write(calendar)
+    text = metrics.render()
+    assert 'nyucal_parse_document_seconds_count 1\n' in text
+    assert 'nyucal_parse_table_seconds_count 1\n' in text
+    assert 'nyucal_parse_row_seconds_count {}\n'.format(
+        len(calendar.events)) in text
+    assert 'nyucal_write_seconds_count{writer="IcsWriter"} 1\n' in text
+    assert 'nyucal_write_seconds{writer="IcsWriter"}' in metrics.summary()
+
+
+def test_cli_stats(cli_runner, html_path):
+    try:
+        result = cli_runner.invoke(cli.main, [
+            '--stats', 'get', '--source=' + str(html_path), 'Fall 2017'])
+    finally:
+        metrics.disable()
+        metrics.reset()
+    assert result.exit_code == 0
+    assert 'nyucal_write_seconds{writer="GcalCsvWriter"}' in result.output
+    assert result.output.startswith('Subject,')
@@ -3,17 +3,25 @@
 
 """Tests for `nyucal` package."""
 
-import os.path
+import asyncio
+from datetime import date
+import io
+import logging
+import os
+import pickle
+import subprocess
+import sys
+import threading
 
 import pytest
 from click.testing import CliRunner
 
+from nyucal import backends
 from nyucal import nyucal
 from nyucal import cli
 
 from difflib import unified_diff
 import ics
-import py.path
 import requests
 from requests.exceptions import ConnectionError
 
@@ -28,21 +36,6 @@ def response():
     # return requests.get('https://github.com/audreyr/cookiecutter-pypackage')
 
 
-@pytest.fixture
-def goldendir(request):
-    """Directory where golden files reside (a py.path.local object)
-    """
-    pwd = os.path.dirname(os.path.realpath(__file__))
-    return py.path.local(os.path.join(pwd, 'golden'))
-
-
-@pytest.fixture
-def html_path(request, goldendir):
-    """NYU Academic Calendar HTML file path"""
-    path = 'New York University - University Registrar - Calendars - Academic Calendar.html'  # noqa
-    return goldendir.join(path)
-
-
 @pytest.fixture
 def html_file(request, html_path):
     """NYU Academic Calendar HTML file object"""
@@ -68,11 +61,6 @@ gold_names = ['Fall 2016', 'Fall 2017', 'Fall 2018',
               'Summer 2017', 'Summer 2018']
 
 
-@pytest.fixture
-def calendar_store(request, html_file):
-    return nyucal.CalendarStore(html_file)
-
-
 def test_calendar_store_construction_from_file(html_file):
     store = nyucal.CalendarStore(html_file)
     assert isinstance(store, nyucal.CalendarStore)
@@ -83,6 +71,20 @@ def test_calendar_store_construction_from_string(html_string):
     assert isinstance(store, nyucal.CalendarStore)
 
 
+def test_calendar_store_backends_agree(html_path):
+    """Every installed backend parses the golden page the same way"""
+    parsed = {}
+    for name in backends.available_backends():
+        store = nyucal.CalendarStore(str(html_path), backend=name)
+        parsed[name] = [
+            (cal.name, [(e.start, e.end, e.name, e.description)
+                        for e in cal.events])
+            for cal in store.calendars.values()]
+    assert 'lxml' in parsed
+    for name in parsed:
+        assert parsed[name] == parsed['lxml']
+
+
 def is_not_online():
     """check if the network is up"""
     try:
@@ -111,6 +113,40 @@ def test_get_calendar_names(calendar_store):
         assert name in calendar_names
 
 
+def test_get_calendar_names_in_document_order(calendar_store):
+    """Calendar names come back in the order they appear on the page"""
+    assert calendar_store.calendar_names[:3] == [
+        'Fall 2016', 'January Term 2017', 'Spring 2017']
+
+
+def test_get_missing_calendar(calendar_store):
+    with pytest.raises(KeyError):
+        calendar_store.calendar('Fall 1900')
+
+
+def test_get_calendars(calendar_store):
+    calendars = calendar_store.calendars
+    assert list(calendars) == calendar_store.calendar_names
+    assert len(calendars) == len(gold_names)
+    assert 'Fall 2017' in calendars
+    assert 'Fall 1900' not in calendars
+    assert [e.name for e in calendars['Fall 2017'].events] == \
+        [e.name for e in calendar_store.calendar('Fall 2017').events]
+
+
+def test_get_calendars_is_lazy_and_memoized(calendar_store):
+    calendars = calendar_store.calendars
+    assert calendars._parsed == {}
+    fall = calendars['Fall 2017']
+    assert fall.name == 'Fall 2017'
+    assert list(calendars._parsed) == ['Fall 2017']
+    assert calendars['Fall 2017'] is fall
+    assert calendar_store.calendars is calendars
+    values = iter(calendars.values())
+    next(values)
+    assert len(calendars._parsed) == 2
+
+
 def test_get_calendar(calendar_store):
     calendar = calendar_store.calendar('Fall 2017')
     assert isinstance(calendar, nyucal.Calendar)
@@ -129,6 +165,28 @@ def test_get_calendar(calendar_store):
     #     assert calendar == golden_object
 
 
+def test_event_has_no_instance_dict():
+    event = nyucal.Event(name='Labor Day', start=date(2017, 9, 4))
+    assert not hasattr(event, '__dict__')
+    assert (event.name, event.description, event.start, event.end) == \
+        ('Labor Day', None, date(2017, 9, 4), None)
+    event.description = 'No classes scheduled'
+    assert event.description == 'No classes scheduled'
+
+
+def test_event_pickles(goldendir):
+    event = nyucal.Event(name='Labor Day', description='No classes',
+                         start=date(2017, 9, 4))
+    copy = pickle.loads(pickle.dumps(event))
+    assert (copy.name, copy.description, copy.start, copy.end) == \
+        (event.name, event.description, event.start, event.end)
+    # pickled before Event had __slots__
+    with goldendir.join('calendar.pkl').open('rb') as pickle_file:
+        calendar = pickle.load(pickle_file)
+    assert calendar.events[0].start == date(2017, 3, 24)
+    assert calendar.events[0].sources is None
+
+
 def test_write_csv(calendar_store, tmpdir, goldendir):
     """Test writing to a CSV file"""
     calendar = calendar_store.calendar('Fall 2017')
@@ -174,10 +232,80 @@ def test_write_ics(calendar_store, tmpdir, goldendir):
         assert event.description == matches[0].description
     
 
-@pytest.fixture
-def cli_runner(request):
-    """A command line runner for click applications"""
-    return CliRunner()
+def test_write_ics_stable_uids(calendar_store):
+    """Writing the same calendar twice gives the same UIDs"""
+    calendar = calendar_store.calendar('Fall 2017')
+    outputs = []
+    for _ in range(2):
+        output = io.StringIO()
+        nyucal.IcsWriter(output).write(calendar)
+        outputs.append([line for line in output.getvalue().split('\r\n')
+                        if line.startswith('UID:')])
+    assert outputs[0] == outputs[1]
+    assert len(set(outputs[0])) == len(calendar.events)
+
+
+def test_write_ics_folds_and_escapes():
+    calendar = nyucal.Calendar()
+    calendar.name = 'Fall 2017'
+    description = 'Fees; late fees, and \\ more.\nSee the Registrar ' * 6
+    calendar.add_event(nyucal.Event(
+        name='Caf\u00e9 hours \u2014 ' * 8, description=description,
+        start=date(2017, 9, 4), end=date(2017, 9, 6)))
+    output = io.StringIO()
+    nyucal.IcsWriter(output).write(calendar)
+    text = output.getvalue()
+    lines = text.split('\r\n')
+    assert lines[-1] == ''
+    assert all(len(line.encode('utf-8')) <= 75 for line in lines)
+    assert 'DTEND;VALUE=DATE:20170907' in lines
+    event = ics.Calendar(text).events.pop()
+    assert event.name == calendar.events[0].name
+    assert event.description == description
+
+
+def test_write_csv_from_iterable(calendar_store):
+    """Writers take a plain iterable of events as well as a calendar"""
+    calendar = calendar_store.calendar('Fall 2017')
+    from_calendar = io.StringIO()
+    nyucal.GcalCsvWriter(from_calendar).write(calendar)
+    from_events = io.StringIO()
+    nyucal.GcalCsvWriter(from_events).write(iter(calendar.events))
+    assert from_events.getvalue() == from_calendar.getvalue()
+
+
+def test_write_ics_from_iterable(calendar_store):
+    calendar = calendar_store.calendar('Fall 2017')
+    output = io.StringIO()
+    nyucal.IcsWriter(output).write(iter(calendar.events))
+    events = ics.Calendar(output.getvalue()).events
+    assert len(events) == len(calendar.events)
+
+
+def test_stream_writer_output_in_bounded_chunks(calendar_store):
+    calendar = calendar_store.calendar('Fall 2017')
+    chunks = list(nyucal.stream(nyucal.GcalCsvWriter, calendar,
+                                buffer_size=512))
+    assert len(chunks) > 1
+    assert all(len(chunk) < 512 + 1024 for chunk in chunks)
+    whole = io.StringIO()
+    nyucal.GcalCsvWriter(whole).write(calendar)
+    assert ''.join(chunks) == whole.getvalue()
+
+
+def test_stream_writer_consumes_lazily():
+    consumed = []
+
+    def events():
+        for day in range(1, 11):
+            consumed.append(day)
+            yield nyucal.Event(name='Day {}'.format(day),
+                               start=date(2017, 9, day))
+
+    chunks = nyucal.stream(nyucal.IcsWriter, events(), buffer_size=1)
+    next(chunks)
+    next(chunks)
+    assert consumed == [1]
 
 
 def test_command_line_interface():
@@ -255,3 +383,334 @@ def test_cli_get_to_file(cli_runner, html_path, goldendir, tmpdir):
         diff = unified_diff(expected_text, received_text,
                             fromfile='expected', tofile='received')
         assert ''.join(diff) == ''
+
+
+def test_cli_get_with_cache_dir_parses_once(cli_runner, html_path, tmpdir,
+                                            monkeypatch):
+    """Filling the parsed-calendar cache parses every table, so `nyucal
+    get` doesn't parse the one it writes again"""
+    parsed = []
+    parse_table = nyucal.CalendarStore._parse_table
+
+    def counting_parse_table(self, table, name):
+        parsed.append(name)
+        return parse_table(self, table, name)
+
+    monkeypatch.setattr(nyucal.CalendarStore, '_parse_table',
+                        counting_parse_table)
+    result = cli_runner.invoke(
+        cli.main, ['get', 'Fall 2017', '--source=' + str(html_path),
+                   '--cache-dir=' + str(tmpdir)])
+    assert result.exit_code == 0
+    assert sorted(parsed) == sorted(gold_names)
+
+
+def test_cli_list_with_cache_dir(cli_runner, calendar_server, tmpdir):
+    """Test that `nyucal list --cache-dir` revalidates instead of
+    downloading again"""
+    args = ['list', '--source=' + calendar_server.url,
+            '--cache-dir=' + str(tmpdir.join('cache'))]
+    for _ in range(2):
+        result = cli_runner.invoke(cli.main, args)
+        assert result.exit_code == 0
+        for name in gold_names:
+            assert name in result.output
+    assert calendar_server.not_modified == 1
+
+
+def test_cli_export_all(cli_runner, html_path, goldendir, tmpdir):
+    """Test the `nyucal export-all` command from a local file"""
+    output_dir = tmpdir.join('out')
+    result = cli_runner.invoke(
+        cli.main, ['export-all',
+                   '--source=' + str(html_path),
+                   '--output-dir=' + str(output_dir),
+                   '--jobs=3'])
+    assert result.exit_code == 0
+    for name in gold_names:
+        assert output_dir.join(name + '.csv').check()
+        assert output_dir.join(name + '.ics').check()
+        assert str(output_dir.join(name + '.csv')) in result.output
+    gold_path = goldendir.join('Fall2017.csv')
+    test_path = output_dir.join('Fall 2017.csv')
+    diff = unified_diff(gold_path.readlines(), test_path.readlines(),
+                        fromfile='expected', tofile='received')
+    assert ''.join(diff) == ''
+
+
+def test_cli_export_all_one_format(cli_runner, html_path, tmpdir):
+    """Test the `nyucal export-all --format` option"""
+    result = cli_runner.invoke(
+        cli.main, ['export-all', '-f', 'ics',
+                   '--source=' + str(html_path),
+                   '--output-dir=' + str(tmpdir)])
+    assert result.exit_code == 0
+    assert sorted(p.basename for p in tmpdir.listdir()) == \
+        sorted(name + '.ics' for name in gold_names)
+
+
+def test_cli_export_all_lists_paths_as_they_finish(cli_runner, html_path,
+                                                   tmpdir, monkeypatch):
+    """A slow file doesn't hold back the paths of those written after it"""
+    others_done = threading.Event()
+    write_calendar = cli.write_calendar
+
+    def slow_first(calendar, format, path):
+        if calendar.name == gold_names[0]:
+            others_done.wait(5)
+        result = write_calendar(calendar, format, path)
+        if calendar.name == gold_names[1]:
+            others_done.set()
+        return result
+
+    monkeypatch.setattr(cli, 'write_calendar', slow_first)
+    result = cli_runner.invoke(
+        cli.main, ['export-all', '-f', 'ics', '--jobs=2',
+                   '--source=' + str(html_path),
+                   '--output-dir=' + str(tmpdir)])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    first = str(tmpdir.join(gold_names[0] + '.ics'))
+    assert first in lines and lines[0] != first
+
+
+def test_stream_calendars_from_file(html_path, calendar_store):
+    """`CalendarStore.stream` parses the same calendars as the store"""
+    calendars = list(nyucal.CalendarStore.stream(str(html_path),
+                                                 chunk_size=1024))
+    assert [cal.name for cal in calendars] == calendar_store.calendar_names
+    for cal in calendars:
+        expected = calendar_store.calendar(cal.name)
+        assert [(e.start, e.end, e.name, e.description)
+                for e in cal.events] == \
+            [(e.start, e.end, e.name, e.description)
+             for e in expected.events]
+
+
+def test_stream_calendars_from_url(calendar_server):
+    names = [cal.name for cal in
+             nyucal.CalendarStore.stream(calendar_server.url)]
+    assert names == [
+        'Fall 2016', 'January Term 2017', 'Spring 2017', 'Summer 2017',
+        'Fall 2017', 'January Term 2018', 'Spring 2018', 'Summer 2018',
+        'Fall 2018']
+
+
+def test_stream_calendars_before_end_of_source(html_string):
+    """The first calendar is yielded before the source is read through"""
+    source = io.StringIO(html_string)
+    calendars = nyucal.CalendarStore.stream(source, chunk_size=1024)
+    first = next(calendars)
+    assert first.name == 'Fall 2016'
+    assert source.tell() < len(html_string) / 2
+
+
+@pytest.mark.parametrize('text,expected', [
+    ('Friday, March 11, 2016', date(2016, 3, 11)),
+    ('Sunday, November 27, 2016', date(2016, 11, 27)),
+    ('Monday, January 2, 2017', date(2017, 1, 2)),
+    ('TUESDAY, january 3, 2017', date(2017, 1, 3)),
+])
+def test_parse_date(text, expected):
+    assert nyucal.parse_date(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    'Monday, March 11, 2016',    # wrong weekday
+    'Friday, Marsh 11, 2016',    # unknown month
+    'Friday, February 30, 2016',  # no such day
+    '03/11/2016',
+])
+def test_parse_date_rejects(text):
+    with pytest.raises(ValueError):
+        nyucal.parse_date(text)
+
+
+def test_parse_logs_rows_at_debug(html_path, caplog):
+    store = nyucal.CalendarStore(str(html_path))
+    with caplog.at_level(logging.DEBUG, logger='nyucal.nyucal'):
+        store.calendar('Fall 2017')
+    assert any(r.getMessage().startswith('event_name: ')
+               for r in caplog.records)
+
+
+def test_quiet_parse_skips_row_logging(html_path, caplog):
+    store = nyucal.CalendarStore(str(html_path), quiet=True)
+    with caplog.at_level(logging.DEBUG, logger='nyucal.nyucal'):
+        store.calendar('Fall 2017')
+    assert caplog.records == []
+
+
+def test_calendar_events_sorted():
+    cal = nyucal.Calendar()
+    cal.add_event(nyucal.Event(name='b', start=date(2017, 9, 5)))
+    cal.add_events([
+        nyucal.Event(name='c', start=date(2017, 9, 4),
+                     end=date(2017, 9, 6)),
+        nyucal.Event(name='a', start=date(2017, 9, 5)),
+        nyucal.Event(name='d', start=date(2017, 9, 4)),
+    ])
+    assert [e.name for e in cal.events] == ['d', 'c', 'a', 'b']
+    # reading again does not re-sort
+    assert cal.events is cal.events
+    cal.add_event(nyucal.Event(name='e', start=date(2017, 9, 1)))
+    assert [e.name for e in cal.events] == ['e', 'd', 'c', 'a', 'b']
+
+
+def test_calendar_events_sorted_across_threads():
+    """Threads reading a new calendar at once all see every event"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(20):
+            cal = nyucal.Calendar()
+            cal.add_events(nyucal.Event(name=str(i), start=date(2017, 9, 4))
+                           for i in range(5000, 0, -1))
+            seen = []
+            barrier = threading.Barrier(4)
+
+            def read():
+                barrier.wait()
+                seen.append(len(cal.events))
+            threads = [threading.Thread(target=read) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert seen == [5000] * 4
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_calendar_events_sort_with_missing_values():
+    cal = nyucal.Calendar()
+    cal.add_events([
+        nyucal.Event(name='x', start=date(2017, 9, 4),
+                     end=date(2017, 9, 5)),
+        nyucal.Event(start=date(2017, 9, 4)),
+        nyucal.Event(name='y'),
+    ])
+    assert [e.name for e in cal.events] == ['y', None, 'x']
+
+
+IMPORT_BUDGET_MS = float(os.environ.get('NYUCAL_IMPORT_BUDGET_MS', 150))
+"""Most time `nyucal list -s FILE` may spend importing modules"""
+
+
+def test_cli_list_from_file_import_cost(html_path):
+    """Cold `nyucal list -s FILE` stays clear of heavy imports it doesn't
+    need, and within its import time budget"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'nyucal.cli',
+         'list', '--source=' + str(html_path)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    for name in gold_names:
+        assert name in result.stdout
+    imported = []
+    total_us = 0
+    after_startup = False
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        (_, cumulative, package) = line[len('import time:'):].split('|')
+        imported.append(package.strip())
+        if not package.startswith(' '):
+            # a top-level import; skip the interpreter's own startup
+            if after_startup:
+                total_us += int(cumulative)
+            after_startup = after_startup or package.strip() == 'site'
+    for heavy in ['requests', 'ics', 'concurrent.futures']:
+        assert heavy not in imported
+    assert total_us / 1000 < IMPORT_BUDGET_MS
+
+
+def test_afetch(calendar_server):
+    """`CalendarStore.afetch` fetches sources concurrently, up to its
+    limit"""
+    calendar_server.delay = 0.1
+    urls = [calendar_server.url + '?page={}'.format(i) for i in range(6)]
+    stores = asyncio.run(nyucal.CalendarStore.afetch(urls, limit=3))
+    assert len(stores) == 6
+    for store in stores:
+        assert store.calendar_names == stores[0].calendar_names
+        assert store.digest == stores[0].digest
+    assert 'Fall 2017' in stores[0].calendar_names
+    assert calendar_server.requests == 6
+    assert 1 < calendar_server.max_in_flight <= 3
+
+
+def test_afetch_through_parsed_cache(calendar_server, tmpdir, monkeypatch):
+    from nyucal.cache import ParsedCache
+    parsed_cache = ParsedCache(str(tmpdir.join('parsed.sqlite3')))
+    urls = [calendar_server.url + '?page={}'.format(i) for i in range(2)]
+    cold = asyncio.run(nyucal.CalendarStore.afetch(
+        urls, parsed_cache=parsed_cache))
+    expected = [e.name for e in cold[0].calendars['Fall 2017'].events]
+
+    def no_parsing(*args):
+        raise AssertionError('parsed HTML on a warm start')
+
+    monkeypatch.setattr(nyucal.CalendarStore, '_parse_string', no_parsing)
+    warm = asyncio.run(nyucal.CalendarStore.afetch(
+        urls, parsed_cache=parsed_cache))
+    for store in warm:
+        assert store.digest == cold[0].digest
+        assert [e.name for e in store.calendars['Fall 2017'].events] == \
+            expected
+
+
+def test_merge_calendars_collapses_duplicates():
+    labor_day = nyucal.Event(name='Labor Day', start=date(2017, 9, 4))
+    described = nyucal.Event(name='Labor Day', description='No classes',
+                             start=date(2017, 9, 4))
+    recess = nyucal.Event(name='Recess', start=date(2017, 11, 22),
+                          end=date(2017, 11, 24))
+    cal = nyucal.merge_calendars('Fall 2017', [
+        ('2016.html', [labor_day]),
+        ('2017.html', [described, recess, recess]),
+    ])
+    assert cal.name == 'Fall 2017'
+    assert [(e.name, e.description, e.sources) for e in cal.events] == [
+        ('Labor Day', 'No classes', ('2016.html', '2017.html')),
+        ('Recess', None, ('2017.html',)),
+    ]
+    # the events merged from are left alone
+    assert labor_day.sources is None and labor_day.description is None
+
+
+def test_calendar_store_merges_sources(html_path, html_string):
+    """Several sources make one store; calendars found in more than one
+    source are merged, with the provenance of each event"""
+    revised = html_string.replace('Fall 2016', 'Fall 2015')
+    store = nyucal.CalendarStore([str(html_path), revised])
+    single = nyucal.CalendarStore(str(html_path))
+    assert store.calendar_names == \
+        single.calendar_names + ['Fall 2015']
+    fall_2017 = store.calendars['Fall 2017']
+    assert len(fall_2017.events) == \
+        len(single.calendars['Fall 2017'].events)
+    assert all(event.sources == (str(html_path), revised)
+               for event in fall_2017.events)
+    assert all(event.sources == (revised,)
+               for event in store.calendars['Fall 2015'].events)
+    with pytest.raises(KeyError):
+        store.calendar('Fall 1999')
+
+
+def test_merge_fetched_stores(calendar_server):
+    urls = [calendar_server.url + '?page={}'.format(i) for i in range(2)]
+    store = nyucal.CalendarStore.merge(
+        asyncio.run(nyucal.CalendarStore.afetch(urls)))
+    assert store.source == urls
+    event = store.calendars['Fall 2017'].events[0]
+    assert event.sources == tuple(urls)
+
+
+def test_cli_list_merges_sources(cli_runner, html_path, html_string):
+    revised = html_string.replace('Fall 2016', 'Fall 2015')
+    result = cli_runner.invoke(cli.main, [
+        'list', '--source=' + str(html_path), '--source=' + revised])
+    assert result.exit_code == 0
+    assert result.output.splitlines() == \
+        nyucal.CalendarStore(str(html_path)).calendar_names + ['Fall 2015']
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `nyucal.sessions` module."""
+
+import pytest
+import requests
+
+from nyucal import nyucal
+from nyucal.cache import HttpCache
+from nyucal.sessions import default_session, make_session
+
+
+def test_session_reuses_connections(calendar_server):
+    session = make_session()
+    for _ in range(3):
+        store = nyucal.CalendarStore(calendar_server.url, session=session)
+        assert 'Fall 2017' in store.calendar_names
+    assert calendar_server.requests == 3
+    assert len(calendar_server.connections) == 1
+
+
+def test_without_session_connections_are_not_reused(calendar_server):
+    """The baseline: module-level requests.get opens a connection per
+    request"""
+    for _ in range(3):
+        requests.get(calendar_server.url)
+    assert len(calendar_server.connections) == 3
+
+
+def test_http_cache_reuses_connections(calendar_server, tmpdir):
+    cache = HttpCache(str(tmpdir), session=make_session())
+    for _ in range(3):
+        cache.fetch(calendar_server.url)
+    assert calendar_server.not_modified == 2
+    assert len(calendar_server.connections) == 1
+
+
+def test_session_retries(calendar_server):
+    calendar_server.failures = 2
+    session = make_session(retries=3, backoff_factor=0)
+    response = session.get(calendar_server.url)
+    assert response.status_code == 200
+    assert calendar_server.requests == 3
+
+
+def test_session_gives_up(calendar_server):
+    calendar_server.failures = 5
+    session = make_session(retries=1, backoff_factor=0)
+    assert session.get(calendar_server.url).status_code == 503
+    assert calendar_server.requests == 2
+
+
+def test_store_raises_when_retries_give_up(calendar_server):
+    calendar_server.failures = 5
+    calendar_server.failure_body = '<html>Service Unavailable</html>'
+    session = make_session(retries=1, backoff_factor=0)
+    with pytest.raises(requests.HTTPError):
+        nyucal.CalendarStore(calendar_server.url, session=session)
+    with pytest.raises(requests.HTTPError):
+        next(nyucal.CalendarStore.stream(calendar_server.url,
+                                         session=session))
+    assert calendar_server.requests == 4
+
+
+def test_session_default_timeout():
+    session = make_session(timeout=(1, 2))
+    assert session.timeout == (1, 2)
+    assert default_session() is default_session()
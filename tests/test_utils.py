@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `nyucal.utils` module."""
+
+import cProfile
+import logging
+import pstats
+import time
+
+from nyucal import cli, utils
+
+
+def spin(seconds):
+    """Keep the CPU busy for a while"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_timed(metrics_enabled, caplog):
+    @utils.timed
+    def double(x):
+        return 2 * x
+
+    caplog.set_level(logging.INFO)
+    assert double(4) == 8
+    assert double.__name__ == 'double'
+    assert caplog.records[-1].getMessage().startswith('time: ')
+    assert ('nyucal_function_seconds_count{function='
+            '"tests.test_utils.test_timed.<locals>.double"} 1') in \
+        metrics_enabled.render()
+
+
+def test_profiled_adds_up_calls():
+    @utils.profiled
+    def fib(n):
+        return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+    assert fib(10) == 55
+    assert fib(5) == 5
+    name = 'tests.test_utils.test_profiled_adds_up_calls.<locals>.fib'
+    stats = utils.profiles[name]
+    assert isinstance(stats, pstats.Stats)
+    # only the outermost call of each recursion is profiled, and both
+    # recursions are added up
+    calls = [ncalls for ((_, _, func), (_, ncalls, _, _, _))
+             in stats.stats.items() if func == 'fib']
+    assert calls == [177 + 15]
+    assert 'fib' in utils.profile_report(stats, limit=5)
+
+
+def test_profiled_leaves_outer_profiler_running():
+    @utils.profiled
+    def inner():
+        return sorted(range(10))
+
+    def later():
+        return sorted(range(20))
+
+    outer = cProfile.Profile()
+    outer.enable()
+    try:
+        inner()
+        later()
+    finally:
+        outer.disable()
+    called = {func for (_, _, func) in pstats.Stats(outer).stats}
+    assert {'inner', 'later'} <= called
+    name = ('tests.test_utils.test_profiled_leaves_outer_profiler_running'
+            '.<locals>.inner')
+    assert name not in utils.profiles
+
+
+def test_sampling_profiler():
+    with utils.SamplingProfiler(interval=0.001) as sampler:
+        spin(0.1)
+    assert sum(sampler.stacks.values()) > 10
+    lines = sampler.collapsed().splitlines()
+    (stack, count) = lines[0].rsplit(' ', 1)
+    assert 'test_utils.py:spin' in stack.split(';')
+    assert int(count) > 0
+    assert 'test_utils.py:spin' in sampler.report()
+
+
+def test_cli_profile_cprofile(cli_runner, html_path, tmpdir):
+    path = str(tmpdir.join('nyucal.prof'))
+    result = cli_runner.invoke(cli.main, [
+        '--profile', 'cprofile', '--profile-output', path,
+        'list', '--source=' + str(html_path)])
+    assert result.exit_code == 0
+    assert 'function calls' in result.output
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_cli_profile_sample(cli_runner, html_path, tmpdir):
+    path = tmpdir.join('nyucal.collapsed')
+    result = cli_runner.invoke(cli.main, [
+        '--profile', 'sample', '--profile-output', str(path),
+        'export-all', '--source=' + str(html_path),
+        '--output-dir=' + str(tmpdir)])
+    assert result.exit_code == 0
+    assert 'Collapsed stacks written to' in result.output
+    assert path.check()
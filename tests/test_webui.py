@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `webui` package."""
+
+import gzip
+
+import ics
+import pytest
+
+import webui
+from nyucal.cache import ArtifactCache, StoreRefresher
+
+
+@pytest.fixture
+def client(request, calendar_server):
+    """A test client for the web UI, scraping the local stand-in server"""
+    webui.app.config['NYUCAL_SOURCE'] = calendar_server.url
+    webui._refresher = None
+    webui._artifact_cache = None
+    webui.app.testing = True
+
+    def teardown():
+        if webui._refresher is not None:
+            webui._refresher.stop(5)
+        webui._refresher = None
+        webui._artifact_cache = None
+
+    request.addfinalizer(teardown)
+    return webui.app.test_client()
+
+
+def test_list_calendars(client):
+    response = client.get('/calendars')
+    assert response.status_code == 200
+    assert b'Fall 2017' in response.data
+
+
+def test_list_calendars_scrapes_once(client, calendar_server):
+    for _ in range(3):
+        assert client.get('/calendars').status_code == 200
+    assert calendar_server.requests == 1
+
+
+def test_get_calendar_csv(client, goldendir):
+    response = client.get('/calendar/Fall 2017.csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'Content-Encoding' not in response.headers
+    gold = goldendir.join('Fall2017.csv').read_binary()
+    assert response.data.replace(b'\r\n', b'\n') == \
+        gold.replace(b'\r\n', b'\n')
+
+
+def test_get_calendar_ics(client):
+    response = client.get('/calendar/Fall 2017.ics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/calendar'
+    calendar = ics.Calendar(response.data.decode('utf-8'))
+    assert 'Labor Day' in [event.name for event in calendar.events]
+
+
+def test_get_calendar_revalidates_with_etag(client):
+    response = client.get('/calendar/Fall 2017.ics')
+    (etag, weak) = response.get_etag()
+    assert etag and not weak
+    assert response.headers['Cache-Control'] == 'public, max-age=300'
+    again = client.get('/calendar/Fall 2017.ics',
+                       headers={'If-None-Match': '"{}"'.format(etag)})
+    assert again.status_code == 304
+    assert again.data == b''
+    other = client.get('/calendar/Fall 2016.ics',
+                       headers={'If-None-Match': '"{}"'.format(etag)})
+    assert other.status_code == 200
+
+
+def test_get_calendar_renders_once(client, monkeypatch):
+    calls = []
+    render = ArtifactCache.render
+
+    def counting_render(self, calendar, writer_class, **kwargs):
+        calls.append((calendar.name, writer_class))
+        return render(self, calendar, writer_class, **kwargs)
+
+    monkeypatch.setattr(ArtifactCache, 'render', counting_render)
+    bodies = [client.get('/calendar/Fall 2017.csv').data for _ in range(3)]
+    assert bodies[0] == bodies[1] == bodies[2]
+    client.get('/calendar/Fall 2017.ics')
+    assert [name for (name, _) in calls] == ['Fall 2017', 'Fall 2017']
+
+
+def test_get_calendar_gzipped(client):
+    plain = client.get('/calendar/Fall 2017.ics')
+    response = client.get('/calendar/Fall 2017.ics',
+                          headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert response.get_etag()[0] != plain.get_etag()[0]
+
+
+def test_get_calendar_uncompressed_when_disabled(client):
+    webui.app.config['NYUCAL_COMPRESS'] = False
+    try:
+        response = client.get('/calendar/Fall 2017.ics',
+                              headers={'Accept-Encoding': 'gzip'})
+    finally:
+        webui.app.config['NYUCAL_COMPRESS'] = True
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.startswith(b'BEGIN:VCALENDAR')
+
+
+def test_health(client):
+    client.get('/calendars')
+    response = client.get('/health')
+    assert response.status_code == 200
+    status = response.get_json()
+    assert status['status'] == 'ok'
+    assert status['refreshes'] == 1
+    assert 0 <= status['age'] < 60
+
+
+def test_health_and_calendars_before_first_load(client):
+    def broken(source):
+        raise IOError('registrar is down')
+
+    webui._refresher = StoreRefresher(webui.app.config['NYUCAL_SOURCE'],
+                                      factory=broken)
+    webui._refresher.refresh()
+    webui.app.config['NYUCAL_STARTUP_WAIT'] = 0
+    try:
+        response = client.get('/calendars')
+    finally:
+        webui.app.config['NYUCAL_STARTUP_WAIT'] = 30
+    assert response.status_code == 503
+    response = client.get('/health')
+    assert response.status_code == 503
+    assert response.get_json()['last_error'] == 'OSError: registrar is down'
+
+
+def test_metrics(client, metrics_enabled):
+    client.get('/calendar/Fall 2017.ics')
+    client.get('/calendar/Fall 2017.ics')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.data.decode('utf-8')
+    assert 'nyucal_fetch_seconds_count 1\n' in text
+    assert 'nyucal_artifact_cache_lookups_total{result="hit"} 1\n' in text
+    assert 'nyucal_write_seconds_count{writer="IcsWriter"} 1\n' in text
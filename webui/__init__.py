@@ -1,17 +1,89 @@
 #!/usr/bin/env python
 
-import io
+import threading
 
-from flask import Flask, render_template
-from nyucal import nyucal
+from flask import Flask, jsonify, render_template, request
+from nyucal import metrics, nyucal
+from nyucal.cache import ArtifactCache, StoreRefresher, StoreUnavailable
 
 
 app = Flask(__name__)
+app.config.setdefault('NYUCAL_SOURCE', nyucal.SOURCE_URL)
+app.config.setdefault('NYUCAL_REFRESH_INTERVAL', 300)
+app.config.setdefault('NYUCAL_STARTUP_WAIT', 30)
+app.config.setdefault('NYUCAL_ARTIFACT_CACHE_SIZE', 64)
+app.config.setdefault('NYUCAL_COMPRESS', True)
+app.config.setdefault('NYUCAL_CACHE_CONTROL', 'public, max-age=300')
+app.config.setdefault('NYUCAL_METRICS', True)
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+_artifact_cache = None
+_artifact_cache_lock = threading.Lock()
+
+
+def get_refresher():
+    """Get the process-wide store refresher, starting it on first use.
+
+    Metrics are turned on first, unless `NYUCAL_METRICS` is false."""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            if app.config['NYUCAL_METRICS']:
+                metrics.enable()
+            _refresher = StoreRefresher(
+                app.config['NYUCAL_SOURCE'],
+                interval=app.config['NYUCAL_REFRESH_INTERVAL'])
+            _refresher.start()
+    return _refresher
+
+
+def get_store():
+    """Get the current snapshot of the calendar store.
+
+    Stores are scraped by the refresher's background thread, never by
+    request handlers.  Only until the first one has loaded, handlers
+    wait for it, for up to `NYUCAL_STARTUP_WAIT` seconds."""
+    return get_refresher().get(app.config['NYUCAL_STARTUP_WAIT'])
+
+
+@app.errorhandler(StoreUnavailable)
+def store_unavailable(error):
+    return 'Calendars are not available yet', 503, {'Retry-After': '30'}
+
+
+def get_artifact_cache():
+    """Get the process-wide cache of rendered calendars"""
+    global _artifact_cache
+    with _artifact_cache_lock:
+        if _artifact_cache is None:
+            _artifact_cache = ArtifactCache(
+                max_entries=app.config['NYUCAL_ARTIFACT_CACHE_SIZE'],
+                encodings=None if app.config['NYUCAL_COMPRESS'] else [])
+    return _artifact_cache
 
 @app.route('/')
 def hello_world():
     return 'Hello, World!'
 
+@app.route('/health')
+def health():
+    """Report the status and age of the last refresh of the calendars.
+
+    Answers `200` while there are calendars to serve, even stale ones,
+    and `503` otherwise.  See :code:`StoreRefresher.status`."""
+    status = get_refresher().status()
+    code = 200 if status['status'] in ('ok', 'stale') else 503
+    return jsonify(status), code
+
+@app.route('/metrics')
+def get_metrics():
+    """Report the metrics in the Prometheus text format"""
+    get_refresher()
+    return app.response_class(metrics.render(),
+                              mimetype='text/plain; version=0.0.4')
+
 @app.route('/calendars')
 def list_calendars():
     """List the available calendars in the calendar source
@@ -20,7 +92,7 @@ def list_calendars():
     this command will fail if no source is specified and the computer
     is not online.
     """
-    store = nyucal.CalendarStore(nyucal.SOURCE_URL)
+    store = get_store()
     return render_template('list.html', names=store.calendar_names)
 
 @app.route('/calendar/<cal_filename>')
@@ -29,10 +101,14 @@ def get_calendar(cal_filename):
 
     `cal_filename` includes an extension, which is used to determine
     the writer class.  The supported extensions are `.csv` and `.ics`.
+
+    Each calendar is rendered once per version of the source, and then
+    served from memory, compressed if the client accepts it.  Responses
+    carry an ETag, so clients polling with `If-None-Match` get a `304`
+    until the calendar changes.
     """
     cal_name, ext = cal_filename.split('.')
-    store = nyucal.CalendarStore(nyucal.SOURCE_URL)
-    calendar = store.calendar(cal_name)
+    store = get_store()
     writers = {
         'csv': nyucal.GcalCsvWriter,
         'ics': nyucal.IcsWriter
@@ -41,13 +117,26 @@ def get_calendar(cal_filename):
         'csv': 'text/csv',
         'ics': 'text/calendar'
     }
-    output = io.StringIO()
-    writer = writers[ext](output)
-    writer.write(calendar)
-    result = output.getvalue()
-    output.close()
-    response = app.make_response(result)
-    response.mimetype = mime_types[ext]
-    return response
+    cache = get_artifact_cache()
+    artifact = cache.get(store, cal_name, writers[ext])
+    (body, etag) = (artifact.body, artifact.etag)
+    # the encodings are in order of preference
+    for encoding in cache.encodings:
+        if request.accept_encodings.quality(encoding) > 0:
+            # each encoding is a different representation, so it needs
+            # its own strong ETag
+            (body, etag) = (artifact.encoded[encoding],
+                            '{}-{}'.format(etag, encoding))
+            break
+    else:
+        encoding = None
+    response = app.response_class(body, mimetype=mime_types[ext])
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if cache.encodings:
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = app.config['NYUCAL_CACHE_CONTROL']
+    return response.make_conditional(request)
 
 